@@ -0,0 +1,113 @@
+"""
+Микробенчмарки чистых функций горячих путей бота на записанных ответах OpenWeatherMap из `benchmarks/fixtures`.
+
+Импортирует только чистые модули, без `loader`, поэтому не требует .env, базы данных и токенов. Запускается
+из корня репозитория:
+
+    python -m benchmarks.run            # сравнить с baseline.json, код возврата 1 при регрессии или без baseline
+    python -m benchmarks.run --save     # записать текущие результаты как новый baseline.json
+    python -m benchmarks.run --threshold 0.5 --only forecast
+
+Для каждой функции берётся лучшее из нескольких повторов время одного вызова в микросекундах. Регрессией считается
+результат, превышающий базовый больше чем на `--threshold` (по умолчанию 25%).
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from entities import FORECAST, hour_board, minute_board, time_board
+from tools.converters import inflect_city, weather_icons, wind_sides
+from tools.forecast import Forecast, extract_weather_data
+
+ROOT = Path(__file__).parent
+BASELINE = ROOT / 'baseline.json'
+WEATHER = json.loads((ROOT / 'fixtures' / 'owm_weather.json').read_text(encoding='utf-8'))
+FORECAST_5_DAYS = json.loads((ROOT / 'fixtures' / 'owm_forecast.json').read_text(encoding='utf-8'))
+
+
+def cases() -> dict:
+    """
+    Собирает измеряемые вызовы. Подготовка данных выполняется здесь, а не внутри измеряемых функций.
+
+    :return: Словарь, сопоставляющий имени бенчмарка функцию без аргументов.
+    :rtype: dict
+    """
+    forecast = Forecast.from_payload(FORECAST_5_DAYS)
+    tomorrow = (forecast.times[0] + timedelta(days=1)).date()
+    ids = [entry['weather'][0]['id'] for entry in FORECAST_5_DAYS['list']]
+    degs = [entry['wind']['deg'] for entry in FORECAST_5_DAYS['list']]
+    weather = extract_weather_data(WEATHER) | {'city': 'Москве', 'adverb': 'Сейчас', 'verb': '',
+                                               'feels_verb': 'ощущается'}
+    return {
+        'converters.wind_sides': lambda: wind_sides(degs),
+        'converters.weather_icons': lambda: weather_icons(ids),
+        'converters.inflect_city': lambda: inflect_city('Санкт-Петербург', {'loct'}),
+        'forecast.extract_weather_data': lambda: extract_weather_data(WEATHER),
+        'forecast.from_payload': lambda: Forecast.from_payload(FORECAST_5_DAYS),
+        'forecast.daypart': lambda: [Forecast.from_payload(FORECAST_5_DAYS).daypart(tomorrow, part)
+                                     for part in ('night', 'morning', 'day', 'evening')],
+        'forecast.at': lambda: forecast.at(forecast.times[20]),
+        'entities.time_board': lambda: time_board(7, 30)('notify_sets'),
+        'entities.hour_board': lambda: hour_board(7, 30)('notify_sets'),
+        'entities.minute_board': lambda: minute_board(7, 30)('notify_sets'),
+        'entities.FORECAST.format': lambda: FORECAST.format(**weather),
+    }
+
+
+def measure(func, repeat: int = 5) -> float:
+    """
+    Измеряет время одного вызова функции.
+
+    :param func: Функция без аргументов.
+    :param repeat: Количество повторов, из которых берётся лучший.
+    :type repeat: int
+
+    :return: Время одного вызова в микросекундах.
+    :rtype: float
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Микробенчмарки горячих путей бота')
+    parser.add_argument('--save', action='store_true', help='записать результаты как новый baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='допустимое замедление относительно baseline')
+    parser.add_argument('--only', default='', help='запускать только бенчмарки, имя которых содержит строку')
+    args = parser.parse_args()
+
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results, regressions, missing = {}, [], []
+    print(f'{"бенчмарк":<32}{"мкс":>10}{"baseline":>10}{"изм.":>9}')
+    for name, func in cases().items():
+        if args.only not in name:
+            continue
+        results[name] = elapsed = measure(func)
+        if (base := baseline.get(name)) is None:
+            print(f'{name:<32}{elapsed:>10.2f}{"—":>10}{"":>9}')
+            missing.append(name)
+            continue
+        change = elapsed / base - 1
+        print(f'{name:<32}{elapsed:>10.2f}{base:>10.2f}{change:>+9.0%}')
+        if change > args.threshold:
+            regressions.append(name)
+
+    if args.save:
+        BASELINE.write_text(json.dumps(baseline | results, indent=2, sort_keys=True) + '\n')
+        print(f'\nBaseline записан в {BASELINE} ({datetime.now():%d.%m.%Y %H:%M})')
+        return 0
+    if missing:
+        print(f'\nНет baseline для {", ".join(missing)}: запишите его через --save и закоммитьте {BASELINE.name}')
+        return 1
+    if regressions:
+        print(f'\nРегрессия больше {args.threshold:.0%}: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
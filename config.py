@@ -0,0 +1,153 @@
+import logging
+from dataclasses import dataclass, field
+
+from dotenv import dotenv_values
+
+INT_KEYS = ['NOTIFY_WORKERS', 'NOTIFY_SHARD_THRESHOLD', 'OUTBOX_WORKERS', 'HISTORY_DAYS', 'EPHEMERAL_TTL', 'POOL_LIMIT',
+            'POOL_QUEUE', 'FSM_SIZE', 'FSM_TTL']
+
+
+@dataclass
+class Settings:
+    """
+    Класс, представляющий типизированные настройки бота из файла .env.
+    Файл читается и проверяется один раз при запуске и повторно только по явному вызову `reload` (например, по SIGHUP).
+
+    :param bot_tokens: Токены Telegram-ботов через запятую; несколько токенов запускают региональные копии бота
+                       в одном процессе, первый считается основным.
+    :type bot_tokens: list[str]
+    :param database_url: URL базы данных для подключения.
+    :type database_url: str
+    :param admins: Список Telegram ID администраторов.
+    :type admins: list[int]
+    :param apikey_weather: Ключ API OpenWeatherMap.
+    :type apikey_weather: str
+    :param apikey_geocode: Ключ API Геокодера Яндекса.
+    :type apikey_geocode: str
+    :param apikey_timezone: Ключ API TimeZoneDB.
+    :type apikey_timezone: str
+    :param cache_path: Путь к файлу персистентного кэша погоды.
+    :type cache_path: str
+    :param notify_workers: Количество процессов для формирования уведомлений (0 — формировать в основном процессе).
+    :type notify_workers: int
+    :param notify_shard_threshold: Минимальное количество получателей в минуту, при котором формирование шардируется.
+    :type notify_shard_threshold: int
+    :param outbox_workers: Количество доставщиков, параллельно отправляющих сообщения из очереди исходящих.
+    :type outbox_workers: int
+    :param gazetteer_path: Путь к индексу офлайн-справочника населённых пунктов.
+    :type gazetteer_path: str
+    :param history_path: Каталог истории наблюдений погоды.
+    :type history_path: str
+    :param history_days: Количество дней, за которые хранится история наблюдений погоды.
+    :type history_days: int
+    :param ephemeral_ttl: Время жизни временных состояний диалогов в секундах.
+    :type ephemeral_ttl: int
+    :param ephemeral_path: Путь к файлу для сохранения временных состояний между перезапусками (по умолчанию пусто —
+                           только память, без синхронной записи на диск при каждом шаге диалога).
+    :type ephemeral_path: str
+    :param pool_limit: Общий предел одновременно обрабатываемых задач (обновлений, уведомлений, рассылок).
+    :type pool_limit: int
+    :param pool_queue: Предел очереди интерактивных обновлений, после которого новые сбрасываются с ответом «занят».
+    :type pool_queue: int
+    :param fsm_size: Максимальное количество чатов, чьи состояния FSM хранятся в памяти.
+    :type fsm_size: int
+    :param fsm_ttl: Время простоя в секундах, после которого состояние FSM чата выгружается из памяти.
+    :type fsm_ttl: int
+    :param path: Путь к файлу .env.
+    :type path: str
+    """
+
+    bot_tokens: list[str]
+    database_url: str
+    admins: list[int]
+    apikey_weather: str
+    apikey_geocode: str
+    apikey_timezone: str
+    cache_path: str = 'weather_cache.sqlite3'
+    notify_workers: int = 0
+    notify_shard_threshold: int = 500
+    outbox_workers: int = 4
+    gazetteer_path: str = 'gazetteer.idx'
+    history_path: str = 'history'
+    history_days: int = 30
+    ephemeral_ttl: int = 24 * 60 * 60
+    ephemeral_path: str = ''
+    pool_limit: int = 64
+    pool_queue: int = 200
+    fsm_size: int = 10000
+    fsm_ttl: int = 60 * 60
+    path: str = '.env'
+    raw: dict = field(default_factory=dict, repr=False)
+
+    @staticmethod
+    def parse(values: dict) -> dict:
+        """
+        Проверяет и приводит к нужным типам значения из файла .env.
+
+        :param values: Словарь значений, прочитанных из .env.
+        :type values: dict
+
+        :return: Словарь аргументов для конструктора `Settings`.
+        :rtype: dict
+
+        :raises ValueError: Если обязательный ключ отсутствует или список админов задан неверно.
+        """
+        required = ['BOT_TOKEN', 'DATABASE_URL', 'APIKEY_WEATHER', 'APIKEY_GEOCODE', 'APIKEY_TIMEZONE']
+        if missing := [key for key in required if not values.get(key)]:
+            raise ValueError(f'Добавьте в .env ключи: {", ".join(missing)}')
+        try:
+            admins = [int(admin) for admin in values['ADMINS'].replace(', ', ',').split(',')]
+        except (AttributeError, KeyError, ValueError):
+            raise ValueError('Добавьте в .env список админов через запятую')
+        try:
+            numbers = {key.lower(): int(values[key]) for key in INT_KEYS if values.get(key)}
+        except ValueError:
+            raise ValueError(f'{", ".join(INT_KEYS)} в .env должны быть целыми числами')
+        tokens = [token.strip() for token in values['BOT_TOKEN'].split(',') if token.strip()]
+        return {key.lower(): values[key] for key in required[1:]} | numbers | {
+            'bot_tokens': tokens, 'admins': admins, 'cache_path': values.get('CACHE_PATH') or 'weather_cache.sqlite3',
+            'gazetteer_path': values.get('GAZETTEER_PATH') or 'gazetteer.idx',
+            'history_path': values.get('HISTORY_PATH') or 'history',
+            'ephemeral_path': values.get('EPHEMERAL_PATH') or '', 'raw': values
+        }
+
+    @classmethod
+    def load(cls, path: str = '.env') -> 'Settings':
+        """
+        Читает и проверяет настройки из файла .env.
+
+        :param path: Путь к файлу .env.
+        :type path: str
+
+        :return: Объект настроек.
+        :rtype: Settings
+
+        :raises ValueError: Если настройки в файле неполные или некорректные.
+        """
+        return cls(**cls.parse(dotenv_values(path)), path=path)
+
+    def reload(self):
+        """
+        Перечитывает файл .env и обновляет настройки на месте. Токены ботов и URL базы данных применяются только при
+        перезапуске. Если новые значения некорректны, сохраняются старые.
+        """
+        try:
+            values = self.parse(dotenv_values(self.path))
+        except ValueError as e:
+            return logging.error('Настройки не перезагружены: %s', e)
+        self.admins[:] = values.pop('admins')
+        for key, value in values.items():
+            setattr(self, key, value)
+        logging.info('Настройки перезагружены из %s', self.path)
+
+    def get(self, key: str) -> str | None:
+        """
+        Возвращает исходное строковое значение ключа из .env без повторного чтения файла.
+
+        :param key: Ключ в .env.
+        :type key: str
+
+        :return: Значение ключа или None, если ключа нет.
+        :rtype: Union[str, None]
+        """
+        return self.raw.get(key)
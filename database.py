@@ -1,10 +1,16 @@
+import time
 from datetime import datetime
+from typing import Callable
 
-from sqlalchemy import ARRAY, JSON, Column, Float, Integer, Time, create_engine
+from sqlalchemy import (ARRAY, JSON, BigInteger, Boolean, Column, Float, Integer, Text, Time, create_engine, insert,
+                        inspect, select, update)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
+
+from tenants import tenant
 
 Base = declarative_base()
+OUTBOX_CHUNK = 10000
 
 
 class User(Base):
@@ -19,16 +25,92 @@ class User(Base):
     :type notify_time: list[datetime.time] (колонка по SQLAlchemy)
     :param state: Словарь состояний пользователя.
     :type state: dict (колонка по SQLAlchemy)
+    :param tenant: ID бота-арендатора, к которому относится пользователь.
+    :type tenant: int (колонка по SQLAlchemy)
     """
 
     __tablename__ = "users"
+    tenant = Column(BigInteger, primary_key=True)
     tg_id = Column(Integer, primary_key=True)
     geo = Column(ARRAY(Float), default=[])
     notify_time = Column(ARRAY(Time), default=[])
     state = Column(JSON, default={})
 
 
+class Broadcast(Base):
+    """
+    Класс, представляющий SQLAlchemy-модель рассылки по всем пользователям с её прогрессом.
+
+    :param id: Идентификатор рассылки.
+    :type id: int (колонка по SQLAlchemy)
+    :param text: Текст рассылки.
+    :type text: str (колонка по SQLAlchemy)
+    :param last_tg_id: Telegram ID последнего пользователя в полностью обработанной странице.
+    :type last_tg_id: int (колонка по SQLAlchemy)
+    :param sent: Количество доставленных сообщений.
+    :type sent: int (колонка по SQLAlchemy)
+    :param blocked: Количество пользователей, заблокировавших бота.
+    :type blocked: int (колонка по SQLAlchemy)
+    :param failed: Количество сообщений, не доставленных по другим причинам.
+    :type failed: int (колонка по SQLAlchemy)
+    :param done: Завершена ли рассылка.
+    :type done: bool (колонка по SQLAlchemy)
+    :param tenant: ID бота-арендатора, по пользователям которого идёт рассылка.
+    :type tenant: int (колонка по SQLAlchemy)
+    """
+
+    __tablename__ = "broadcasts"
+    id = Column(Integer, primary_key=True)
+    text = Column(Text)
+    last_tg_id = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    done = Column(Boolean, default=False)
+    tenant = Column(BigInteger)
+
+
+class Outbox(Base):
+    """
+    Класс, представляющий SQLAlchemy-модель исходящего уведомления, ожидающего отправки или уже отправленного.
+
+    :param id: Идентификатор сообщения.
+    :type id: int (колонка по SQLAlchemy)
+    :param tg_id: Telegram ID получателя.
+    :type tg_id: int (колонка по SQLAlchemy)
+    :param text: Текст сообщения.
+    :type text: str (колонка по SQLAlchemy)
+    :param status: Итог доставки: 'pending', 'sent', 'blocked', 'failed' или 'expired'.
+    :type status: str (колонка по SQLAlchemy)
+    :param attempts: Количество неудачных попыток отправки.
+    :type attempts: int (колонка по SQLAlchemy)
+    :param not_before: Время (UNIX-время), раньше которого сообщение нельзя забирать на отправку: конец аренды
+                       доставщиком или паузы перед повтором.
+    :type not_before: float (колонка по SQLAlchemy)
+    :param created_at: Время постановки в очередь (UNIX-время).
+    :type created_at: float (колонка по SQLAlchemy)
+    :param tenant: ID бота-арендатора, от имени которого отправляется сообщение.
+    :type tenant: int (колонка по SQLAlchemy)
+    """
+
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    tg_id = Column(Integer)
+    text = Column(Text)
+    status = Column(Text, default='pending', index=True)
+    attempts = Column(Integer, default=0)
+    not_before = Column(Float, default=0)
+    created_at = Column(Float)
+    tenant = Column(BigInteger)
+
+
 class Database:
+    """
+    Доступ к данным бота. Запросы к пользователям и создаваемые рассылки относятся к текущему арендатору
+    из контекстной переменной `tenants.tenant`, так что несколько ботов одного процесса работают с общими таблицами,
+    не видя пользователей друг друга.
+    """
+
     def __init__(self, url):
         """
         Инициализирует новый экземпляр базы данных.
@@ -38,6 +120,61 @@ class Database:
         """
         self.engine = create_engine(url)
         self.session = Session(self.engine)
+        self.listeners = []
+        Base.metadata.create_all(self.engine)
+
+    def migrate(self, primary: int):
+        """
+        Переводит таблицы, созданные до появления арендаторов, на колонку `tenant`: существующие строки отдаются
+        основному арендатору, а первичный ключ пользователей становится составным (tenant, tg_id).
+        Ничего не делает, если колонка уже есть.
+
+        :param primary: ID основного бота-арендатора.
+        :type primary: int
+        """
+        for table in ('users', 'broadcasts', 'outbox'):
+            if 'tenant' in {column['name'] for column in inspect(self.engine).get_columns(table)}:
+                continue
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN tenant BIGINT')
+                connection.exec_driver_sql(f'UPDATE {table} SET tenant = {int(primary)}')
+                if table == 'users':
+                    connection.exec_driver_sql('ALTER TABLE users ALTER COLUMN tenant SET NOT NULL, '
+                                               'DROP CONSTRAINT users_pkey, ADD PRIMARY KEY (tenant, tg_id)')
+
+    def subscribe(self, listener: Callable[[int], None]):
+        """
+        Подписывает слушателя на изменения данных пользователей, важных для рассылки уведомлений
+        (координаты, время уведомлений, город и часовой пояс).
+
+        :param listener: Функция, принимающая Telegram ID изменённого пользователя.
+        :type listener: Callable[[int], None]
+        """
+        self.listeners.append(listener)
+
+    def _changed(self, tg_id: int):
+        for listener in self.listeners:
+            listener(tg_id)
+
+    def _users(self, *columns) -> Query:
+        return self.session.query(*(columns or (User,))).filter(User.tenant == tenant.get())
+
+    def schedule_rows(self, tg_id: int = None) -> list[tuple]:
+        """
+        Синхронно получает только те поля пользователей, которые нужны планировщику уведомлений, не загружая
+        ORM-объекты целиком.
+
+        :param tg_id: Telegram ID пользователя текущего арендатора (необязательно). Если не указан, возвращаются все
+                      пользователи всех арендаторов.
+        :type tg_id: int
+
+        :return: Список кортежей (tg_id, geo, notify_time, tz_shift, city, tenant).
+        :rtype: list[tuple]
+        """
+        columns = User.tg_id, User.geo, User.notify_time, User.state['tz_shift'], User.state['city'], User.tenant
+        if tg_id is None:
+            return self.session.query(*columns).all()
+        return self._users(*columns).filter(User.tg_id == tg_id).all()
 
     # GETTERS
 
@@ -51,7 +188,7 @@ class Database:
         :return: объект пользователя или None, если пользователь не существует.
         :rtype: Union[User, None]
         """
-        return self.session.query(User).filter(User.tg_id == tg_id).first()
+        return self._users().filter(User.tg_id == tg_id).first()
 
     async def get_state(self, tg_id: int, key: str):
         """
@@ -71,10 +208,74 @@ class Database:
 
         :return: Список объектов типа User.
         """
-        return self.session.query(User).all()
+        return self._users().all()
+
+    async def get_user_ids(self, after: int = 0, limit: int = 200) -> list[int]:
+        """
+        Постранично получает Telegram ID пользователей по возрастанию, не загружая объекты пользователей целиком.
+
+        :param after: Telegram ID, после которого начинается страница.
+        :type after: int
+        :param limit: Размер страницы.
+        :type limit: int
+
+        :return: Список Telegram ID пользователей.
+        :rtype: list[int]
+        """
+        query = self._users(User.tg_id).filter(User.tg_id > after).order_by(User.tg_id).limit(limit)
+        return [tg_id for tg_id, in query]
+
+    async def get_broadcast(self, broadcast_id: int) -> Broadcast | None:
+        """
+        Извлекает рассылку из базы данных по её идентификатору.
+
+        :param broadcast_id: Идентификатор рассылки.
+        :type broadcast_id: int
+
+        :return: Объект рассылки или None, если рассылка не существует.
+        :rtype: Union[Broadcast, None]
+        """
+        return self.session.get(Broadcast, broadcast_id)
+
+    async def get_unfinished_broadcasts(self) -> list[Broadcast]:
+        """
+        Получает все незавершённые рассылки, например, прерванные падением бота.
+
+        :return: Список объектов типа Broadcast.
+        """
+        return self.session.query(Broadcast).filter(Broadcast.done.is_(False)).order_by(Broadcast.id).all()
 
     # SETTERS
 
+    async def create_broadcast(self, text: str) -> int:
+        """
+        Создаёт новую рассылку в базе данных.
+
+        :param text: Текст рассылки.
+        :type text: str
+
+        :return: Идентификатор созданной рассылки.
+        :rtype: int
+        """
+        broadcast = Broadcast(text=text, tenant=tenant.get())
+        self.session.add(broadcast)
+        self.session.commit()
+        return broadcast.id
+
+    async def update_broadcast(self, broadcast_id: int, **progress):
+        """
+        Записывает прогресс рассылки.
+
+        :param broadcast_id: Идентификатор рассылки.
+        :type broadcast_id: int
+        :param progress: Обновляемые поля рассылки: last_tg_id, sent, blocked, failed, done.
+
+        :raises KeyError: Если рассылки с заданным идентификатором не существует.
+        """
+        if self.session.query(Broadcast).filter(Broadcast.id == broadcast_id).update(progress, 'fetch'):
+            return self.session.commit()
+        raise KeyError
+
     async def create_user(self, tg_id: int, geo: list[float] = None, notify_time: list[str] = None, state: dict = None):
         """
         Создаёт нового пользователя в базе данных.
@@ -91,9 +292,10 @@ class Database:
         data = {k: v for k, v in list(locals().items())[1:] if v is not None}
         if notify_time := data.get("notify_time"):
             data["notify_time"] = datetime.strptime(notify_time, "%H:%M").time()
-        user = User(**data)
+        user = User(tenant=tenant.get(), **data)
         self.session.add(user)
         self.session.commit()
+        self._changed(tg_id)
 
     async def set_geo(self, tg_id: int, geo: list[float]):
         """
@@ -108,8 +310,9 @@ class Database:
         """
 
         if await self.get_user(tg_id):
-            self.session.query(User).filter(User.tg_id == tg_id).update({User.geo: geo}, 'fetch')
-            return self.session.commit()
+            self._users().filter(User.tg_id == tg_id).update({User.geo: geo}, 'fetch')
+            self.session.commit()
+            return self._changed(tg_id)
         raise KeyError
 
     async def set_notify(self, tg_id: int, notify_time: str):
@@ -125,8 +328,9 @@ class Database:
         """
         if user := await self.get_user(tg_id):
             user.notify_time.append(datetime.strptime(notify_time, "%H:%M").time())
-            self.session.query(User).filter(User.tg_id == tg_id).update({User.notify_time: user.notify_time}, 'fetch')
-            return self.session.commit()
+            self._users().filter(User.tg_id == tg_id).update({User.notify_time: user.notify_time}, 'fetch')
+            self.session.commit()
+            return self._changed(tg_id)
         raise KeyError
 
     async def set_state(self, tg_id: int, key, value):
@@ -142,8 +346,11 @@ class Database:
         """
         if user := await self.get_user(tg_id):
             user.state[key] = value
-            self.session.query(User).filter(User.tg_id == tg_id).update({User.state: user.state}, 'fetch')
-            return self.session.commit()
+            self._users().filter(User.tg_id == tg_id).update({User.state: user.state}, 'fetch')
+            self.session.commit()
+            if key in ('tz_shift', 'city'):
+                self._changed(tg_id)
+            return
         raise KeyError
 
     # DELETERS
@@ -158,8 +365,9 @@ class Database:
         :raises KeyError: Если пользователя с заданным Telegram ID не существует.
         """
         if await self.get_user(tg_id):
-            self.session.query(User).filter(User.tg_id == tg_id).update({User.geo: []}, 'fetch')
-            return self.session.commit()
+            self._users().filter(User.tg_id == tg_id).update({User.geo: []}, 'fetch')
+            self.session.commit()
+            return self._changed(tg_id)
         raise KeyError
 
     async def delete_notify(self, tg_id: int, notify_time: str):
@@ -176,8 +384,9 @@ class Database:
         """
         if user := await self.get_user(tg_id):
             user.notify_time.remove(datetime.strptime(notify_time, "%H:%M").time())
-            self.session.query(User).filter(User.tg_id == tg_id).update({User.notify_time: user.notify_time}, 'fetch')
-            return self.session.commit()
+            self._users().filter(User.tg_id == tg_id).update({User.notify_time: user.notify_time}, 'fetch')
+            self.session.commit()
+            return self._changed(tg_id)
         raise KeyError
 
     async def delete_state(self, tg_id: int, key):
@@ -194,8 +403,11 @@ class Database:
         if user := await self.get_user(tg_id):
             if user.state[key]:
                 user.state.pop(key)
-                self.session.query(User).filter(User.tg_id == tg_id).update({User.state: user.state}, 'fetch')
-                return self.session.commit()
+                self._users().filter(User.tg_id == tg_id).update({User.state: user.state}, 'fetch')
+                self.session.commit()
+                if key in ('tz_shift', 'city'):
+                    self._changed(tg_id)
+                return
             raise ValueError
         raise KeyError
 
@@ -210,5 +422,97 @@ class Database:
         """
         if user := await self.get_user(tg_id):
             self.session.delete(user)
-            return self.session.commit()
+            self.session.commit()
+            return self._changed(tg_id)
         raise KeyError
+
+    # OUTBOX
+
+    async def enqueue_outbox(self, messages: list[tuple[int, int, str]]) -> int:
+        """
+        Ставит сообщения в очередь исходящих одной транзакцией: многострочными INSERT по `OUTBOX_CHUNK` строк,
+        то есть обычно одним запросом на всю минуту уведомлений всех арендаторов.
+
+        :param messages: Список кортежей (ID бота-арендатора, Telegram ID получателя, текст сообщения).
+        :type messages: list[tuple[int, int, str]]
+
+        :return: Количество поставленных в очередь сообщений.
+        :rtype: int
+        """
+        created_at = time.time()
+        for start in range(0, len(messages), OUTBOX_CHUNK):
+            self.session.execute(insert(Outbox).values([
+                {'tenant': tenant_id, 'tg_id': tg_id, 'text': text, 'created_at': created_at}
+                for tenant_id, tg_id, text in messages[start:start + OUTBOX_CHUNK]
+            ]))
+        self.session.commit()
+        return len(messages)
+
+    async def claim_outbox(self, limit: int, lease: float) -> list[tuple[int, int, int, str, int, float]]:
+        """
+        Забирает на отправку пачку ожидающих сообщений и арендует их на `lease` секунд. Строки выбираются через
+        `FOR UPDATE SKIP LOCKED`, поэтому несколько доставщиков, в том числе из разных процессов, не ждут друг друга
+        и не получают одни и те же сообщения. Если доставщик не отчитался до конца аренды (например, процесс упал),
+        сообщения снова становятся доступны.
+
+        :param limit: Максимальный размер пачки.
+        :type limit: int
+        :param lease: Время аренды в секундах.
+        :type lease: float
+
+        :return: Список кортежей (id, tenant, tg_id, text, attempts, created_at).
+        :rtype: list[tuple[int, int, int, str, int, float]]
+        """
+        now = time.time()
+        due = (select(Outbox.id).where(Outbox.status == 'pending', Outbox.not_before <= now).order_by(Outbox.id)
+               .limit(limit).with_for_update(skip_locked=True))
+        rows = self.session.execute(update(Outbox).where(Outbox.id.in_(due)).values(not_before=now + lease)
+                                    .returning(Outbox.id, Outbox.tenant, Outbox.tg_id, Outbox.text, Outbox.attempts,
+                                               Outbox.created_at)
+                                    .execution_options(synchronize_session=False)).all()
+        self.session.commit()
+        return [tuple(row) for row in rows]
+
+    async def finish_outbox(self, status: str, ids: list[int]):
+        """
+        Записывает итог доставки сообщений.
+
+        :param status: Итог доставки: 'sent', 'blocked', 'failed' или 'expired'.
+        :type status: str
+        :param ids: Идентификаторы сообщений.
+        :type ids: list[int]
+        """
+        if ids:
+            self.session.execute(update(Outbox).where(Outbox.id.in_(ids)).values(status=status)
+                                 .execution_options(synchronize_session=False))
+            self.session.commit()
+
+    async def retry_outbox(self, ids: list[int], delay: float):
+        """
+        Возвращает сообщения в очередь для повторной отправки не раньше чем через `delay` секунд.
+
+        :param ids: Идентификаторы сообщений.
+        :type ids: list[int]
+        :param delay: Пауза перед повтором в секундах.
+        :type delay: float
+        """
+        if ids:
+            self.session.execute(update(Outbox).where(Outbox.id.in_(ids))
+                                 .values(attempts=Outbox.attempts + 1, not_before=time.time() + delay)
+                                 .execution_options(synchronize_session=False))
+            self.session.commit()
+
+    async def prune_outbox(self, before: float) -> int:
+        """
+        Удаляет из очереди исходящих сообщения с известным итогом доставки, поставленные в очередь раньше `before`.
+
+        :param before: Граница времени постановки в очередь (UNIX-время).
+        :type before: float
+
+        :return: Количество удалённых сообщений.
+        :rtype: int
+        """
+        query = self.session.query(Outbox).filter(Outbox.status != 'pending', Outbox.created_at < before)
+        deleted = query.delete(synchronize_session=False)
+        self.session.commit()
+        return deleted
@@ -78,8 +78,31 @@ NOTIFY_SUCCESS = 'Уведомление успешно создано!  🥳'
 FORECAST = ('{icon} {adverb} в {city} {verb}{desc}.\n🌡️ На улице {temp}°C ({feels_verb} как {feels_like}°C).\n🫠 '
             'Давление: {pressure} мм рт.ст.\n💦 Влажность: {humidity}%.\n🍃 {wind_side} ветер скоростью {wind_speed} '
             'м/c.\n☁️ На небе облачность в {clouds}%.')
+BUSY = '⏳ Сейчас я очень занят, попробуйте ещё раз через пару секунд.'
+NO_FORECAST_SLOT = 'На это время прогноза у меня нет. 🤷🏻‍♂️ Открой прогноз заново, чтобы увидеть актуальные часы.'
+STALE_FORECAST = '🕰️ Сервис погоды сейчас недоступен, поэтому показываю данные на {:%d.%m %H:%M}.'
 SUN_DESC = '🌅 Восход сегодня {verb_sr} в {sunrise}.\n🌇 Закат {verb_ss} в {sunset}.'
 
+BROADCAST_USAGE = 'Напиши текст рассылки после команды: /broadcast Текст сообщения'
+BROADCAST_STARTED = 'Рассылка #{} запущена 📣 Сообщу, когда она закончится.'
+BROADCAST_DONE = 'Рассылка завершена 📬\nДоставлено: {sent}, заблокировали бота: {blocked}, ошибок: {failed}.'
+RERESOLVE_DONE = 'Города пользователей пересчитаны по справочнику 🗺️ Изменилось: {}.'
+STATS = ('📊 Работаю {uptime}.\n\n'
+         '📨 Обновлений: {updates} ({types}), {rate:.2f}/с за минуту, ошибок {errors}.\n'
+         '⏱️ Обработка: p50 {p50:.0f} мс, p95 {p95:.0f} мс.\n'
+         '🗄️ Запросов к базе: {queries}.\n'
+         '🌐 Провайдеры:\n{providers}\n'
+         '💾 Кэш погоды: попаданий {cache} из {lookups}. Пропущено правок: {edits}, отменено нажатий: {dropped}.\n'
+         '📤 Очередь отправки: {queue} ждут, {sending} отправляются, сброшено обновлений: {shed}.\n'
+         '📬 Исходящие: доставлено {outbox_sent}, заблокировали {outbox_blocked}, не доставлено {outbox_failed}, '
+         'устарело {outbox_expired}, повторов {outbox_retried}.\n'
+         '🧠 FSM: {fsm_size} записей, вытеснено {fsm_evicted}, истекло {fsm_expired}, восстановлено {fsm_rehydrated}.\n'
+         '⏰ Уведомления: запаздывание {lag:.2f} с, длительность {duration:.2f} с.')
+PROFILE_USAGE = 'Укажи длительность профилирования в секундах от 1 до {}: /profile 10'
+PROFILE_STARTED = 'Снимаю профиль CPU {} с ⏱️'
+PROFILE_BUSY = 'Профиль уже снимается, дождись его окончания ⏳'
+PROFILE_DONE = 'Профиль CPU за {} с 🔬'
+
 SOON = 'В разработке — ждите очень скоро! 🔜'
 
 
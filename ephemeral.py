@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from tenants import tenant
+
+
+def scoped(key: str) -> str:
+    """
+    Добавляет к ключу состояния префикс текущего бота-арендатора.
+
+    :param key: Ключ состояния.
+    :type key: str
+
+    :return: Ключ с префиксом арендатора.
+    :rtype: str
+    """
+    return f'{tenant.get()}/{key}'
+
+
+class EphemeralStore:
+    """
+    Хранилище короткоживущих состояний диалогов (ID главного сообщения, экран перехода, выбранные часы и минуты,
+    состояние aiogram) с тем же интерфейсом, что и словарь состояний в `Database`. Значения живут в памяти и истекают
+    через `ttl` секунд после последней записи; при указании `path` они дублируются в локальную SQLite-базу,
+    чтобы пережить перезапуск бота. Долговечные поля пользователя (город, часовой пояс) остаются в `Database`.
+    Ключи хранятся с префиксом текущего бота-арендатора, так что диалоги одного пользователя с разными ботами
+    не смешиваются.
+    """
+
+    def __init__(self, ttl: float = 24 * 60 * 60, path: str = None):
+        """
+        Инициализирует новое хранилище.
+
+        :param ttl: Время жизни значения в секундах.
+        :type ttl: float
+        :param path: Путь к файлу SQLite-базы для персистентности (необязательно).
+        :type path: str
+        """
+        self.ttl, self.data, self.task = ttl, {}, None
+        self.connection = sqlite3.connect(path) if path else None
+        if self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS states (tg_id INTEGER, key TEXT, value TEXT, '
+                                    'expires_at REAL, PRIMARY KEY (tg_id, key))')
+            self.connection.execute('DELETE FROM states WHERE expires_at < ?', (time.time(),))
+            for tg_id, key, value, expires_at in self.connection.execute('SELECT * FROM states'):
+                self.data.setdefault(tg_id, {})[key] = (json.loads(value), expires_at)
+            self.connection.commit()
+
+    # GETTERS
+
+    async def get_state(self, tg_id: int, key: str):
+        """
+        Получает значение состояния заданного пользователя Telegram.
+
+        :param tg_id: Telegram ID пользователя.
+        :type tg_id: int
+        :param key: Ключ состояния.
+        :type key: str
+
+        :return: Значение состояния или None, если его нет или оно истекло.
+        """
+        if (entry := self.data.get(tg_id, {}).get(key := scoped(key))) is None:
+            return None
+        if entry[1] < time.time():
+            self._pop(tg_id, key)
+            return None
+        return entry[0]
+
+    async def get_states(self, key: str) -> dict[int, object]:
+        """
+        Получает значения состояния с заданным ключом у всех пользователей, например, для восстановления состояний
+        aiogram после перезапуска.
+
+        :param key: Ключ состояния.
+        :type key: str
+
+        :return: Словарь, сопоставляющий Telegram ID пользователя значению состояния.
+        :rtype: dict[int, object]
+        """
+        now, key = time.time(), scoped(key)
+        return {tg_id: states[key][0] for tg_id, states in self.data.items() if key in states and states[key][1] >= now}
+
+    # SETTERS
+
+    async def set_state(self, tg_id: int, key: str, value):
+        """
+        Устанавливает значение состояния заданного пользователя Telegram и продлевает его время жизни.
+
+        :param tg_id: Telegram ID пользователя.
+        :type tg_id: int
+        :param key: Ключ состояния.
+        :type key: str
+        :param value: Значение состояния, сериализуемое в JSON.
+        """
+        expires_at, key = time.time() + self.ttl, scoped(key)
+        self.data.setdefault(tg_id, {})[key] = (value, expires_at)
+        if self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?)',
+                                    (tg_id, key, json.dumps(value), expires_at))
+            self.connection.commit()
+
+    # DELETERS
+
+    async def delete_state(self, tg_id: int, key: str):
+        """
+        Удаляет значение состояния заданного пользователя Telegram.
+
+        :param tg_id: Telegram ID пользователя.
+        :type tg_id: int
+        :param key: Ключ состояния.
+        :type key: str
+
+        :raises KeyError: Если такого состояния у пользователя нет.
+        """
+        if (key := scoped(key)) not in self.data.get(tg_id, {}):
+            raise KeyError
+        self._pop(tg_id, key)
+
+    async def clear(self, tg_id: int):
+        """
+        Удаляет все состояния заданного пользователя Telegram у текущего бота-арендатора.
+
+        :param tg_id: Telegram ID пользователя.
+        :type tg_id: int
+        """
+        prefix = scoped('')
+        for key in [key for key in self.data.get(tg_id, {}) if key.startswith(prefix)]:
+            self._pop(tg_id, key)
+
+    def purge(self) -> int:
+        """
+        Удаляет из памяти и с диска все истёкшие состояния, в том числе состояния чатов, которые больше не пишут
+        боту и поэтому никогда не будут прочитаны снова.
+
+        :return: Количество удалённых состояний.
+        :rtype: int
+        """
+        now, removed = time.time(), 0
+        for tg_id in list(self.data):
+            states = self.data[tg_id]
+            for key in [key for key, (_, expires_at) in states.items() if expires_at < now]:
+                states.pop(key)
+                removed += 1
+            if not states:
+                self.data.pop(tg_id)
+        if self.connection:
+            self.connection.execute('DELETE FROM states WHERE expires_at < ?', (now,))
+            self.connection.commit()
+        return removed
+
+    def start(self, interval: float = 60 * 60):
+        """
+        Запускает в фоне текущего цикла событий периодическую очистку истёкших состояний.
+
+        :param interval: Интервал между очистками в секундах.
+        :type interval: float
+        """
+        self.task = asyncio.create_task(self._purging(interval))
+
+    async def _purging(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                logging.info('Удалено истёкших временных состояний: %s', self.purge())
+            except sqlite3.Error:
+                logging.exception('Не удалось удалить истёкшие временные состояния')
+
+    def _pop(self, tg_id: int, key: str):
+        states = self.data[tg_id]
+        states.pop(key)
+        if not states:
+            self.data.pop(tg_id)
+        if self.connection:
+            self.connection.execute('DELETE FROM states WHERE tg_id = ? AND key = ?', (tg_id, key))
+            self.connection.commit()
+
+
+class BoundedStorage(MemoryStorage):
+    """
+    Хранилище FSM aiogram с ограниченным объёмом памяти. Записи чатов, к которым не обращались дольше `ttl` секунд,
+    удаляются, а при превышении `size` записей вытесняются давно не использованные. Состояние вытесненного чата
+    лениво восстанавливается при следующем обновлении от него, поэтому при запуске ничего загружать не нужно.
+    Источник восстановления — `EphemeralStore`, а не `Database`: состояние aiogram — короткоживущее поле диалога,
+    которое хранится вместе с остальными временными состояниями, так что восстановление не требует запроса к базе
+    данных на горячем пути обработки обновлений. Пустые записи (без состояния и данных) не хранятся вовсе.
+    """
+
+    def __init__(self, store: EphemeralStore, size: int = 10000, ttl: float = 60 * 60):
+        """
+        Инициализирует хранилище.
+
+        :param store: Хранилище временных состояний, из которого восстанавливается состояние aiogram.
+        :type store: EphemeralStore
+        :param size: Максимальное количество записей в памяти.
+        :type size: int
+        :param ttl: Время простоя записи в секундах, после которого она удаляется из памяти.
+        :type ttl: float
+        """
+        super().__init__()
+        self.store, self.size, self.ttl = store, size, ttl
+        self.touched = OrderedDict()
+        self.evicted = self.expired = self.rehydrated = 0
+
+    async def set_state(self, bot: Bot, key: StorageKey, state: StateType = None):
+        await super().set_state(bot, key, state)
+        self._settle(key)
+
+    async def get_state(self, bot: Bot, key: StorageKey) -> str | None:
+        await self._rehydrate(key)
+        state = await super().get_state(bot, key)
+        self._settle(key)
+        return state
+
+    async def set_data(self, bot: Bot, key: StorageKey, data: dict[str, Any]):
+        await self._rehydrate(key)
+        await super().set_data(bot, key, data)
+        self._settle(key)
+
+    async def get_data(self, bot: Bot, key: StorageKey) -> dict[str, Any]:
+        await self._rehydrate(key)
+        data = await super().get_data(bot, key)
+        self._settle(key)
+        return data
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает метрики хранилища.
+
+        :return: Словарь с количеством записей в памяти, вытесненных, истёкших и восстановленных записей.
+        :rtype: dict[str, int]
+        """
+        return {'size': len(self.storage), 'evicted': self.evicted, 'expired': self.expired,
+                'rehydrated': self.rehydrated}
+
+    async def _rehydrate(self, key: StorageKey):
+        if key in self.storage:
+            return
+        token = tenant.set(key.bot_id)
+        try:
+            state = await self.store.get_state(key.chat_id, 'aiogram_state')
+        finally:
+            tenant.reset(token)
+        if state:
+            self.storage[key].state = state
+            self.rehydrated += 1
+
+    def _settle(self, key: StorageKey):
+        record = self.storage.get(key)
+        if record is None or record.state is None and not record.data:
+            self.storage.pop(key, None)
+            self.touched.pop(key, None)
+            return
+        self.touched[key] = now = time.monotonic()
+        self.touched.move_to_end(key)
+        while self.touched:
+            oldest, touched_at = next(iter(self.touched.items()))
+            if touched_at >= now - self.ttl and len(self.touched) <= self.size:
+                break
+            if touched_at < now - self.ttl:
+                self.expired += 1
+            else:
+                self.evicted += 1
+            self.touched.popitem(last=False)
+            self.storage.pop(oldest, None)
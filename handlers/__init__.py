@@ -1 +1 @@
-from . import location, notify, start, weather
+from . import admin, location, notify, start, weather
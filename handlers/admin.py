@@ -0,0 +1,68 @@
+import asyncio
+import logging
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+
+from entities import (BROADCAST_STARTED, BROADCAST_USAGE, PROFILE_BUSY, PROFILE_DONE, PROFILE_STARTED, PROFILE_USAGE,
+                      RERESOLVE_DONE, STATS)
+from tools.bot import AdminFilter, reresolve_cities
+from tools.broadcast import start_broadcast
+from tools.metrics import collect_stats, metrics
+
+MAX_PROFILE, tasks = 300, set()
+
+router = Router(name='admin -> router')
+router.message.filter(AdminFilter())
+router.callback_query.filter(AdminFilter())
+
+
+@router.message(Command('broadcast'))
+async def broadcast(msg: Message, command: CommandObject):
+    logging.debug('broadcast (msg: %s, command: %s)', msg, command)
+    if not command.args:
+        return await msg.answer(BROADCAST_USAGE)
+    await msg.answer(BROADCAST_STARTED.format(await start_broadcast(command.args)))
+
+
+@router.message(Command('reresolve'))
+async def reresolve(msg: Message):
+    logging.debug('reresolve (msg: %s)', msg)
+    await msg.answer(RERESOLVE_DONE.format(await reresolve_cities()))
+
+
+@router.message(Command('stats'))
+async def stats(msg: Message):
+    logging.debug('stats (msg: %s)', msg)
+    await msg.answer(STATS.format(**collect_stats()))
+
+
+@router.message(Command('profile'))
+async def profile(msg: Message, command: CommandObject):
+    logging.debug('profile (msg: %s, command: %s)', msg, command)
+    if not (command.args or '').strip().isdigit() or not 1 <= (seconds := int(command.args)) <= MAX_PROFILE:
+        return await msg.answer(PROFILE_USAGE.format(MAX_PROFILE))
+    if metrics.profiling:
+        return await msg.answer(PROFILE_BUSY)
+    task = asyncio.create_task(send_profile(msg, seconds))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    await msg.answer(PROFILE_STARTED.format(seconds))
+
+
+async def send_profile(msg: Message, seconds: int):
+    """
+    Снимает профиль CPU в фоне и отправляет сводку админу. Обработчик `/profile` не ждёт профиль, поэтому не держит
+    слот пула обновлений и не попадает со временем профилирования в перцентили `/stats`.
+
+    :param msg: Сообщение с командой.
+    :type msg: Message
+    :param seconds: Длительность профилирования в секундах.
+    :type seconds: int
+    """
+    try:
+        summary = await metrics.profile(seconds)
+    except RuntimeError:
+        return await msg.answer(PROFILE_BUSY)
+    await msg.answer_document(BufferedInputFile(summary.encode(), 'profile.txt'), caption=PROFILE_DONE.format(seconds))
@@ -1,17 +1,20 @@
+import asyncio
 import logging
 
 from aiogram import F, Router
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
+from aiogram.types import CallbackQuery, Message
 
 from entities import (CURR_LOCATION, LOCATION, LOCATION_ERROR, NO_LOCATION_FORECAST, NO_LOCATION_NOTIFY, CallbackData,
                       Dialog, location_board)
 from handlers import notify, start, weather
-from loader import bot, db
+from loader import bot, db, ephemeral
 from tools.api import geocoding, get_tzshift, reverse_geocoding
-from tools.bot import delete_state, set_state
+from tools.bot import delete_state, remove_reply_keyboard, set_state
+from tools.concurrency import gather_strict
 from tools.converters import inflect_city
+from tools.edits import edits
 
 router = Router(name='location -> router')
 
@@ -20,18 +23,18 @@ router = Router(name='location -> router')
 async def send_location(call: CallbackQuery | CallbackData, state: FSMContext):
     logging.debug('send_location (call: %s, state: %s)', call, state)
     await set_state(state, Dialog.get_geo)
-    if await db.get_state(call.message.chat.id, 'from') == 'settings':
+    if await ephemeral.get_state(call.message.chat.id, 'from') == 'settings':
         if city := await db.get_state(call.message.chat.id, 'city'):
             text = f"{CURR_LOCATION.format(inflect_city(city, {'gent'}))}\n\n{LOCATION}"
         else:
             text = LOCATION
-    elif await db.get_state(call.message.chat.id, 'from') == 'forecast':
+    elif await ephemeral.get_state(call.message.chat.id, 'from') == 'forecast':
         text = f'{NO_LOCATION_FORECAST}\n\n{LOCATION}'
-    elif await db.get_state(call.message.chat.id, 'from') == 'notify':
+    elif await ephemeral.get_state(call.message.chat.id, 'from') == 'notify':
         text = NO_LOCATION_NOTIFY
     await call.message.delete()
     main_msg = await call.message.answer(text, reply_markup=location_board)
-    await db.set_state(main_msg.chat.id, 'main_msg_id', main_msg.message_id)
+    await ephemeral.set_state(main_msg.chat.id, 'main_msg_id', main_msg.message_id)
 
 
 @router.message(F.location, StateFilter(Dialog.get_geo))
@@ -39,45 +42,52 @@ async def get_location_as_object(msg: Message, state: FSMContext):
     logging.debug('get_location_as_object (msg: %s, state: %s)', msg, state)
 
     geo = [msg.location.longitude, msg.location.latitude]
-    await db.set_geo(msg.chat.id, geo)
-    city = await reverse_geocoding(geo)
-    await db.set_state(msg.chat.id, 'city', city)
-    await db.set_state(msg.chat.id, 'tz_shift', await get_tzshift(geo))
-
-    await msg.delete()
-    service_msg = await bot.send_message(msg.chat.id, 'ㅤ', reply_markup=ReplyKeyboardRemove())
-    await service_msg.delete()
-    await bot.delete_message(msg.chat.id, await db.get_state(msg.chat.id, 'main_msg_id'))
-    if await db.get_state(msg.chat.id, 'from') == 'settings':
-        await start.settings(CallbackData('settings', msg), state)
-    elif await db.get_state(msg.chat.id, 'from') == 'forecast':
-        await weather.forecast(CallbackData('weather forecast', msg), state)
-    elif await db.get_state(msg.chat.id, 'from') == 'notify':
-        await notify.notify_settings(CallbackData('notify_settings', msg), state)
-    await delete_state(state)
+    city, tz_shift, main_msg_id, from_, *_ = await gather_strict(
+        reverse_geocoding(geo), get_tzshift(geo),
+        ephemeral.get_state(msg.chat.id, 'main_msg_id'), ephemeral.get_state(msg.chat.id, 'from'),
+        asyncio.shield(msg.delete()), asyncio.shield(remove_reply_keyboard(msg.chat.id))
+    )
+    await gather_strict(db.set_geo(msg.chat.id, geo), db.set_state(msg.chat.id, 'city', city),
+                        db.set_state(msg.chat.id, 'tz_shift', tz_shift), bot.delete_message(msg.chat.id, main_msg_id))
+    await return_from_location(msg, state, from_)
 
 
 @router.message(F.text != '🔙 Назад', StateFilter(Dialog.get_geo))
 async def get_location_as_text(msg: Message, state: FSMContext):
     logging.debug('get_location_as_text (msg: %s, state: %s)', msg, state)
-    await msg.delete()
+    main_msg_id, from_ = await gather_strict(ephemeral.get_state(msg.chat.id, 'main_msg_id'),
+                                             ephemeral.get_state(msg.chat.id, 'from'))
     try:
-        geo, city = await geocoding(msg.text)
+        (geo, city), _ = await gather_strict(geocoding(msg.text), asyncio.shield(msg.delete()))
     except ValueError:
-        await bot.edit_message_text(LOCATION_ERROR, msg.chat.id, await db.get_state(msg.chat.id, 'main_msg_id'))
+        await edits.edit_text(msg.chat.id, main_msg_id, LOCATION_ERROR)
         return
 
-    await db.set_geo(msg.chat.id, geo)
-    await db.set_state(msg.chat.id, 'city', city)
-    await db.set_state(msg.chat.id, 'tz_shift', await get_tzshift(geo))
+    tz_shift = await get_tzshift(geo)
+    await gather_strict(
+        db.set_geo(msg.chat.id, geo), db.set_state(msg.chat.id, 'city', city),
+        db.set_state(msg.chat.id, 'tz_shift', tz_shift),
+        remove_reply_keyboard(msg.chat.id), bot.delete_message(msg.chat.id, main_msg_id)
+    )
+    await return_from_location(msg, state, from_)
+
+
+async def return_from_location(msg: Message, state: FSMContext, from_: str):
+    """
+    Возвращает пользователя на экран, с которого он перешёл к указанию местоположения.
+
+    :param msg: Сообщение пользователя с местоположением.
+    :type msg: Message
+    :param state: Объект FSMContext.
+    :type state: FSMContext
+    :param from_: Экран, с которого пришёл пользователь: 'settings', 'forecast' или 'notify'.
+    :type from_: str
+    """
 
-    service_msg = await bot.send_message(msg.chat.id, 'ㅤ', reply_markup=ReplyKeyboardRemove())
-    await service_msg.delete()
-    await bot.delete_message(msg.chat.id, await db.get_state(msg.chat.id, 'main_msg_id'))
-    if await db.get_state(msg.chat.id, 'from') == 'settings':
+    if from_ == 'settings':
         await start.settings(CallbackData('settings', msg), state)
-    elif await db.get_state(msg.chat.id, 'from') == 'forecast':
+    elif from_ == 'forecast':
         await weather.forecast(CallbackData('weather forecast', msg), state)
-    elif await db.get_state(msg.chat.id, 'from') == 'notify':
+    elif from_ == 'notify':
         await notify.notify_settings(CallbackData('notify_settings', msg), state)
     await delete_state(state)
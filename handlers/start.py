@@ -5,14 +5,16 @@ from aiogram import F, Router
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
+from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder as Board
 
 from entities import (DATA_DELETED, LOCATION_SET, SETTINGS, START, CallbackData,
                       Dialog, back_btn, settings_board, start_board)
-from loader import bot, db
-from tools.bot import delete_state, get_greeting
+from loader import bot, db, ephemeral
+from tools.bot import delete_state, get_greeting, remove_reply_keyboard
+from tools.concurrency import gather_strict
 from tools.converters import inflect_city
+from tools.edits import edits
 
 router = Router(name='start -> router')
 
@@ -42,38 +44,34 @@ async def start(resp: CallbackQuery | Message | CallbackData, state: FSMContext)
 async def settings(call: CallbackQuery | CallbackData, state: FSMContext):
     logging.debug('settings (call: %s, state: %s)', call, state)
     user = await db.get_user(call.message.chat.id)
-    if user.state.get('from') == 'settings':
+    if await ephemeral.get_state(call.message.chat.id, 'from') == 'settings':
         text = f"{LOCATION_SET.format(inflect_city(user.state.get('city'), {'gent'}))}\n\n{SETTINGS}"
         await call.message.answer(text, reply_markup=settings_board)
     else:
-        await call.message.edit_text(SETTINGS, reply_markup=settings_board)
-    await db.set_state(call.message.chat.id, 'from', 'settings')
+        await edits.edit_text(call.message.chat.id, call.message.message_id, SETTINGS, settings_board)
+    await ephemeral.set_state(call.message.chat.id, 'from', 'settings')
 
 
 @router.callback_query(F.data == 'back_settings', StateFilter(Dialog.get_geo))
 @router.message(F.text == '🔙 Назад', StateFilter(Dialog.get_geo))
 async def back_to_settings(msg: Message, state: FSMContext):
     logging.debug('back_to_settings (msg: %s, state: %s)', msg, state)
-    await msg.delete()
-    service_msg = await bot.send_message(msg.chat.id, 'ㅤ', reply_markup=ReplyKeyboardRemove())
-    await service_msg.delete()
-
-    await bot.delete_message(msg.chat.id, await db.get_state(msg.chat.id, 'main_msg_id'))
-    if await db.get_state(msg.chat.id, 'from') == 'settings':
-        await msg.answer(SETTINGS, reply_markup=settings_board)
-    elif await db.get_state(msg.chat.id, 'from') == 'forecast':
+    main_msg_id, from_ = await gather_strict(ephemeral.get_state(msg.chat.id, 'main_msg_id'),
+                                             ephemeral.get_state(msg.chat.id, 'from'))
+    await gather_strict(msg.delete(), remove_reply_keyboard(msg.chat.id), bot.delete_message(msg.chat.id, main_msg_id))
+
+    if from_ == 'forecast':
         return await start(CallbackData('back_', msg), state)
-    elif await db.get_state(msg.chat.id, 'from') == 'notify':
-        await msg.answer(SETTINGS, reply_markup=settings_board)
-    await delete_state(state)
-    await db.set_state(msg.chat.id, 'from', 'settings')
+    await gather_strict(msg.answer(SETTINGS, reply_markup=settings_board), delete_state(state))
+    await ephemeral.set_state(msg.chat.id, 'from', 'settings')
 
 
 @router.callback_query(F.data == 'delete_data')
 async def delete_data(call: CallbackQuery, state: FSMContext):
     logging.debug('delete_data (call: %s, state: %s)', call, state)
     await db.delete_user(call.message.chat.id)
-    await call.message.edit_text(DATA_DELETED, reply_markup=Board([[back_btn(text='В главное меню 🏠')]]).as_markup())
+    await edits.edit_text(call.message.chat.id, call.message.message_id, DATA_DELETED,
+                          Board([[back_btn(text='В главное меню 🏠')]]).as_markup())
 
 
 @router.callback_query(F.data == 'ok', StateFilter('*'))
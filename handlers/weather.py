@@ -1,4 +1,3 @@
-from collections import Counter
 from datetime import datetime, time, timedelta
 import logging
 
@@ -8,12 +7,15 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardButton as Button
 from aiogram.utils.keyboard import InlineKeyboardBuilder as Board
 
-from entities import FORECAST, LOCATION_SET, SUN_DESC, CallbackData, back_btn
+from entities import FORECAST, LOCATION_SET, NO_FORECAST_SLOT, CallbackData, back_btn
 from handlers import location
-from loader import db
-from tools.api import get_weather, get_weather_5_days
-from tools.bot import delete_state
+from loader import db, ephemeral
+from tools.api import get_weather, get_weather_5_days, past_weather, prefetch_forecast
+from tools.bot import delete_state, stale_text, sun_text
 from tools.converters import inflect_city
+from tools.edits import edits
+from tools.forecast import DAYPARTS
+from tools.sun import local_now, sun_status
 
 router = Router(name='weather -> router')
 
@@ -24,16 +26,15 @@ async def forecast(call: CallbackQuery, state: FSMContext):
 
     user = await db.get_user(call.message.chat.id)
     if not user.geo:
-        await db.set_state(call.message.chat.id, 'from', 'forecast')
+        await ephemeral.set_state(call.message.chat.id, 'from', 'forecast')
         return await location.send_location(CallbackData('send_location', call.message), state)
 
-    weather, sun_status = await get_weather(user.geo)
+    prefetch_forecast(user.geo)
+    weather = await get_weather(user.geo)
     context = {'adverb': 'Сейчас', 'verb': '', 'feels_verb': 'ощущается'}
     text = FORECAST.format(**({'city': inflect_city(user.state['city'], {'loct'})} | weather | context))
-
-    sun_status = {'verb_sr': 'был' if datetime.now().time() > sun_status['sunrise'] else 'будет',
-                  'verb_ss': 'был' if datetime.now().time() > sun_status['sunset'] else 'будет'} | sun_status
-    text += '\n\n' + SUN_DESC.format(**sun_status)
+    tz_shift = user.state.get('tz_shift', 0)
+    text += sun_text(sun_status(user.geo, tz_shift), local_now(tz_shift).time()) + stale_text(weather.get('as_of'))
 
     next_ = min(filter(lambda h: h > datetime.now().hour, range(0, 25, 3))) % 24
     today, tomorrow = datetime.now().strftime('%d.%m.%Y'), (datetime.now() + timedelta(days=1)).strftime("%d.%m.%Y")
@@ -47,11 +48,11 @@ async def forecast(call: CallbackQuery, state: FSMContext):
         Button(text=f'{tomorrow} ⏩', callback_data=f'forecast {tomorrow}-09:00')
     ], [Button(text='🔹 Завтра 🔹', callback_data='tomorrow forecast day')], [back_btn()]]).as_markup()
 
-    if await db.get_state(call.message.chat.id, 'from') == 'forecast':
+    if await ephemeral.get_state(call.message.chat.id, 'from') == 'forecast':
         text = f"{LOCATION_SET.format(inflect_city(user.state.get('city'), {'gent'}))}\n\n{text}"
         await call.message.answer(text, reply_markup=board)
     else:
-        await call.message.edit_text(text, reply_markup=board)
+        await edits.edit_text(call.message.chat.id, call.message.message_id, text, board)
     await delete_state(state)
 
 
@@ -60,16 +61,26 @@ async def forecast_by_time(call: CallbackQuery, state: FSMContext):
     logging.debug('forecast_by_time (call: %s, state: %s)', call, state)
 
     cb_time, user = datetime.strptime(call.data.split()[1], '%d.%m.%Y-%H:%M'), await db.get_user(call.message.chat.id)
-    weather_list = await get_weather_5_days(user.geo)
-    weather = next(filter(lambda w: w[0] == cb_time, weather_list))[1]
+    if cb_time > datetime.now() or (weather := await past_weather(user.geo, cb_time)) is None:
+        forecast_ = await get_weather_5_days(user.geo)
+        weather, as_of = forecast_.at(cb_time), forecast_.as_of
+    else:
+        as_of = None
+    if weather is None:
+        return await call.answer(NO_FORECAST_SLOT, True)
+    if cb_time > datetime.now():
+        tense = {'verb': 'будет ', 'feels_verb': 'ощутится'}
+    else:
+        tense = {'verb': 'было ', 'feels_verb': 'ощущалось'}
     match cb_time.date().day - datetime.now().date().day:
         case 0:
-            context = {'adverb': f'Сегодня в {cb_time.strftime("%H:%M")}', 'verb': 'будет ', 'feels_verb': 'ощутится'}
+            context = {'adverb': f'Сегодня в {cb_time.strftime("%H:%M")}'} | tense
         case 1:
-            context = {'adverb': 'Завтра', 'verb': 'будет ', 'feels_verb': 'ощутится'}
+            context = {'adverb': 'Завтра'} | tense
         case _:
-            context = {'adverb': 'В этот день', 'verb': 'будет ', 'feels_verb': 'ощутится'}
+            context = {'adverb': 'В этот день'} | tense
     text = FORECAST.format(**({'city': inflect_city(user.state['city'], {'loct'})} | weather | context))
+    text += stale_text(as_of)
 
     if cb_time - timedelta(hours=3) > datetime.now():
         p = cb_time - timedelta(hours=3)
@@ -114,7 +125,7 @@ async def forecast_by_time(call: CallbackQuery, state: FSMContext):
 
     board.row(back_btn())
 
-    await call.message.edit_text(text, reply_markup=board.as_markup())
+    await edits.edit_text(call.message.chat.id, call.message.message_id, text, board.as_markup())
 
 
 @router.callback_query(F.data.startswith('tomorrow forecast'))
@@ -122,36 +133,14 @@ async def tomorrow_forecast(call: CallbackQuery, state: FSMContext):
     logging.debug('tomorrow_forecast (call: %s, state: %s)', call, state)
 
     user = await db.get_user(call.message.chat.id)
-    two_day_weather_list = await get_weather_5_days(user.geo, 16)
+    two_day_forecast = await get_weather_5_days(user.geo)
     tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_list = list(filter(lambda w: w[0].day == tomorrow.day, two_day_weather_list))
-    time_of_day = {'night': 'ночью', 'morning': 'утром', 'day': 'днём', 'evening': 'вечером'}[call.data.split()[-1]]
-    if time_of_day == 'ночью':
-        data = list(map(lambda w: w[1], filter(lambda w: w[0].hour < 5, tomorrow_list)))
-    elif time_of_day == 'утром':
-        data = list(map(lambda w: w[1], filter(lambda w: 5 <= w[0].hour <= 11, tomorrow_list)))
-    elif time_of_day == 'днём':
-        data = list(map(lambda w: w[1], filter(lambda w: 12 <= w[0].hour <= 17, tomorrow_list)))
-    elif time_of_day == 'вечером':
-        data = list(map(lambda w: w[1], filter(lambda w: 18 <= w[0].hour, tomorrow_list)))
-
-    length, tod_to_icon_convert = len(data), {
-        'ночью': '🌃', 'утром': '🌇', 'днём': Counter(map(lambda d: d['icon'], data)).most_common(1)[0][0],
-        'вечером': '🌇'
-    }
-    weather = {
-        'adverb': 'Завтра ' + time_of_day, 'verb': 'будет ', 'feels_verb': 'ощутится',
-        'icon': tod_to_icon_convert[time_of_day],
-        'desc': Counter(map(lambda d: d['desc'], data)).most_common(1)[0][0],
-        'temp': round(sum(map(lambda d: d['temp'], data)) / length, 2),
-        'feels_like': round(sum(map(lambda d: d['feels_like'], data)) / length, 2),
-        'pressure': round(sum(map(lambda d: d['pressure'], data)) / length, 2),
-        'humidity': round(sum(map(lambda d: d['humidity'], data)) / length),
-        'wind_side': Counter(map(lambda d: d['wind_side'], data)).most_common(1)[0][0],
-        'wind_speed': round(sum(map(lambda d: d['wind_speed'], data)) / length, 2),
-        'clouds': round(sum(map(lambda d: d['clouds'], data)) / length)
-    }
+    part = call.data.split()[-1]
+    if (weather := two_day_forecast.daypart(tomorrow.date(), part)) is None:
+        return await call.answer(NO_FORECAST_SLOT, True)
+    weather |= {'adverb': 'Завтра ' + DAYPARTS[part][0], 'verb': 'будет ', 'feels_verb': 'ощутится'}
     text = FORECAST.format(**({'city': inflect_city(user.state['city'], {'loct'})} | weather))
+    text += stale_text(two_day_forecast.as_of)
 
     board = Board()
     board.row(Button(text='🌃 Ночью', callback_data='tomorrow forecast night'),
@@ -163,5 +152,4 @@ async def tomorrow_forecast(call: CallbackQuery, state: FSMContext):
     board.row(back_btn())
 
     await call.answer()
-    if text != call.message.text:
-        await call.message.edit_text(text, reply_markup=board.as_markup())
+    await edits.edit_text(call.message.chat.id, call.message.message_id, text, board.as_markup())
@@ -1,26 +1,36 @@
 import sys
 
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from dotenv import dotenv_values, set_key
-from pymorphy2 import MorphAnalyzer
+from aiogram import Dispatcher
+from dotenv import set_key
 
+from config import Settings
 from database import Database
+from ephemeral import BoundedStorage, EphemeralStore
+from tenants import TenantBots, tenant
 
-get = lambda key: dotenv_values(".env").get(key)
-set_ = lambda key, value: set_key(".env", key, value.encode("utf-8").decode("windows-1251"))
+try:
+    settings = Settings.load(".env")
+except ValueError as e:
+    print(e)
+    sys.exit(1)
 
 
-bot = Bot(get("BOT_TOKEN"), parse_mode="HTML")
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
-morph = MorphAnalyzer()
+def get(key):
+    return settings.get(key)
 
-db = Database(get("DATABASE_URL"))
-scheduler = AsyncIOScheduler()
-try:
-    ADMINS = [int(admin) for admin in get("ADMINS").replace(", ", ",").split(",")]
-except (AttributeError, ValueError):
-    print("Добавьте в .env список админов через запятую")
-    sys.exit(1)
+
+def set_(key, value):
+    set_key(settings.path, key, value.encode("utf-8").decode("windows-1251"))
+    settings.reload()
+
+
+bot = TenantBots(settings.bot_tokens, parse_mode="HTML")
+# Код вне обработки обновлений (запуск, планировщик) по умолчанию работает от имени основного бота
+tenant.set(bot.primary)
+
+db = Database(settings.database_url)
+db.migrate(bot.primary)
+ephemeral = EphemeralStore(settings.ephemeral_ttl, settings.ephemeral_path)
+storage = BoundedStorage(ephemeral, settings.fsm_size, settings.fsm_ttl)
+dp = Dispatcher(storage=storage)
+ADMINS = settings.admins
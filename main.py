@@ -1,20 +1,41 @@
 import asyncio
+import signal
 
-from pytz import timezone
-
-from handlers import location, notify, start, weather
-from loader import bot, dp, scheduler
-from tools.bot import notify_admins, restore_states, send_notifies
+from handlers import admin, location, notify, start, weather
+from loader import bot, dp, ephemeral, settings
+from tenants import TenantMiddleware
+from tools.api import client, places
+from tools.bot import notify_admins
+from tools.broadcast import resume_broadcasts
+from tools.debounce import latest_wins
+from tools.metrics import metrics
+from tools.notifier import notifier
+from tools.outbox import outbox
+from tools.priority import LoadShedMiddleware, pools
+from tools.snapshot import schedule
 
 
 async def main():
-    await restore_states()
-    dp.include_routers(start.router, weather.router, location.router, notify.router)
-    scheduler.start()
+    if hasattr(signal, 'SIGHUP'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, settings.reload)
+    schedule.load()
+    await asyncio.get_running_loop().run_in_executor(None, places.build)
+    dp.update.outer_middleware(TenantMiddleware())
+    dp.update.outer_middleware(metrics)
+    dp.callback_query.outer_middleware(LoadShedMiddleware(pools, 'callbacks'))
+    dp.message.outer_middleware(LoadShedMiddleware(pools, 'messages'))
+    dp.callback_query.outer_middleware(latest_wins)
+    dp.include_routers(admin.router, start.router, weather.router, location.router, notify.router)
+    notifier.start()
+    ephemeral.start()
+    outbox.start()
     await notify_admins('Бот перезапущен 🚀 /start')
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    await resume_broadcasts()
+    try:
+        await dp.start_polling(*bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        await client().close()
 
 
 if __name__ == "__main__":
-    scheduler.add_job(send_notifies, 'cron', minute='*', timezone=timezone('Europe/Moscow'))
     asyncio.run(main())
@@ -0,0 +1,51 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import Update
+
+tenant: ContextVar[int] = ContextVar('tenant')
+
+
+class TenantBots:
+    """
+    Набор ботов-арендаторов одного процесса: региональных копий бота с разными токенами, которые используют общие
+    кэши, справочники и планировщик. Арендатор определяется по ID бота. Атрибуты набора перенаправляются боту текущего
+    арендатора из контекстной переменной `tenant`, поэтому код, обращающийся к `loader.bot`, отправляет сообщения
+    от имени того бота, чьё обновление или чью задачу он обрабатывает.
+    """
+
+    def __init__(self, tokens: list[str], **defaults):
+        """
+        Создаёт ботов по токенам с общим пулом HTTP-соединений к Bot API. Первый токен считается основным
+        арендатором.
+
+        :param tokens: Токены Telegram-ботов.
+        :type tokens: list[str]
+        :param defaults: Аргументы конструктора `Bot`, общие для всех ботов (например, `parse_mode`).
+        """
+        self.session = AiohttpSession()
+        self.bots = {(bot := Bot(token, session=self.session, **defaults)).id: bot for token in tokens}
+        self.primary = next(iter(self.bots))
+
+    def __iter__(self):
+        return iter(self.bots.values())
+
+    def __len__(self) -> int:
+        return len(self.bots)
+
+    def __getattr__(self, name: str):
+        return getattr(self.bots[tenant.get()], name)
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Middleware уровня обновлений, которое делает арендатором бота, получившего обновление."""
+
+    async def __call__(self, handler: Callable[[Update, dict[str, Any]], Awaitable[Any]], event: Update,
+                       data: dict[str, Any]) -> Any:
+        token = tenant.set(data['bot'].id)
+        try:
+            return await handler(event, data)
+        finally:
+            tenant.reset(token)
@@ -1 +1 @@
-from . import api, bot, converters
+# Подмодули импортируются явно: чистые модули (converters, forecast) не должны тянуть за собой loader
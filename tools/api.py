@@ -1,70 +1,212 @@
-from aiohttp import ClientSession
-from datetime import datetime
+import asyncio
+import logging
+from datetime import datetime, timedelta
 
-from loader import get
-from tools.converters import degrees_to_side, weather_id_to_icon
+from aiohttp import ClientSession, ClientTimeout
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
-def extract_weather_data(data: dict) -> dict:
-    return {
-        'icon': weather_id_to_icon(data['weather'][0]['id']),
-        'desc': data['weather'][0]['description'],
-        'temp': data['main']['temp'],
-        'feels_like': data['main']['feels_like'],
-        'pressure': round(data['main']['pressure'] * 0.750064, 2),
-        'humidity': data['main']['humidity'],
-        'wind_side': degrees_to_side(data['wind']['deg']).capitalize(),
-        'wind_speed': data['wind']['speed'],
-        'clouds': data['clouds']['all']
-    }
+from loader import settings
+from tools.breaker import CircuitBreaker
+from tools.cache import WeatherCache
+from tools.converters import geo_to_cell
+from tools.forecast import DAYPARTS, Forecast, extract_weather_data
+from tools.gazetteer import Gazetteer, SpatialIndex
+from tools.history import ObservationHistory
 
+WEATHER_TTL, FORECAST_TTL = 10 * 60, 60 * 60
+weather_cache = WeatherCache(settings.cache_path)
+decoded_forecasts, history = {}, ObservationHistory(settings.history_path, settings.history_days)
+inflight, prefetches = {}, set()
+owm, yandex = CircuitBreaker('OpenWeatherMap'), CircuitBreaker('Yandex Geocoder')
+timezonedb = CircuitBreaker('TimeZoneDB')
+gazetteer = Gazetteer(settings.gazetteer_path)
+places = SpatialIndex(gazetteer)
+session: ClientSession | None = None
 
-async def get_weather(geo: list[float]) -> list:
+
+def client() -> ClientSession:
+    """
+    Возвращает общую для всех запросов к внешним API HTTP-сессию с пулом соединений, создавая её при первом вызове.
+
+    :return: HTTP-сессия aiohttp.
+    :rtype: ClientSession
+    """
+    global session
+    if session is None or session.closed:
+        session = ClientSession(timeout=ClientTimeout(total=10))
+    return session
+
+
+async def fetch_json(url: str, params: dict) -> dict:
+    """
+    Выполняет GET-запрос к API и разбирает JSON-ответ.
+
+    :param url: Адрес API.
+    :type url: str
+    :param params: Параметры запроса.
+    :type params: dict
+
+    :return: Ответ API в виде словаря.
+    :rtype: dict
+
+    :raises ValueError: Если API отклонил запрос с кодом 4xx, например, из-за неверного ключа или координат.
+                        Такие ответы не считаются сбоями провайдера в `CircuitBreaker`.
+    :raises ConnectionError: Если API ответил ошибкой сервера 5xx, превышением лимита запросов 429 или другим
+                             кодом, отличным от 200.
+    """
+
+    async with client().get(url, params=params) as resp:
+        if 400 <= resp.status < 500 and resp.status != 429:
+            raise ValueError(f'{url} rejected the request with status {resp.status}')
+        if resp.status != 200:
+            raise ConnectionError(f'{url} responded with status {resp.status}')
+        return await resp.json(loads=json_loads)
+
+
+async def get_weather(geo: list[float]) -> dict:
     """
     Получает информацию о текущей погоде по координатам, используя OpenWeatherMap API.
 
     :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
     :type geo: list[float]
 
-    :return: список из цифр, представляющих погоду.
-    :rtype: list
+    :return: Словарь с данными о текущей погоде. Время восхода и заката вычисляется локально в `tools.sun`.
+    :rtype: dict
+
+    :raises ValueError: Если координаты недействителен или на сервере внутренняя ошибка.
+    :raises ConnectionError: Если возникает проблема с подключением к API OpenWeatherMap.
+    """
+
+    if (r_dict := weather_cache.get('weather', cell := geo_to_cell(geo), WEATHER_TTL)) is None:
+        params = {'lon': geo[0], 'lat': geo[1], 'units': 'metric', 'lang': 'ru', 'appid': settings.apikey_weather}
+        try:
+            r_dict = await owm.call(fetch_json, 'https://api.openweathermap.org/data/2.5/weather', params)
+        except ConnectionError:
+            if (entry := weather_cache.peek('weather', cell)) is None:
+                raise
+            return extract_weather_data(entry[1]) | {'as_of': datetime.fromtimestamp(entry[0])}
+        weather_cache.put('weather', cell, r_dict)
+        history.append(cell, 'weather', Forecast.from_payload({'list': [r_dict]}))
+    return extract_weather_data(r_dict)
+
+
+async def get_weather_5_days(geo: list[float], cnt: int = 40) -> Forecast:
+    """
+    Получает прогноз погоды на 5 дней с шагом в 3 часа по координатам, используя OpenWeatherMap API.
+    Всегда запрашивается и кэшируется полный прогноз на 40 отсчётов, из которого возвращаются первые `cnt`.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    :param cnt: Количество отсчётов прогноза.
+    :type cnt: int
+
+    :return: Колоночный прогноз погоды. Разобранный прогноз переиспользуется, пока ответ API в кэше не обновится.
+    :rtype: Forecast
+
+    :raises ValueError: Если координаты недействителен или на сервере внутренняя ошибка.
+    :raises ConnectionError: Если возникает проблема с подключением к API OpenWeatherMap.
+    """
+
+    cell = geo_to_cell(geo)
+    if (r_dict := weather_cache.get('forecast', cell, FORECAST_TTL)) is not None:
+        if (decoded := decoded_forecasts.get(cell)) is None or decoded[0] is not r_dict:
+            decoded_forecasts[cell] = decoded = r_dict, Forecast.from_payload(r_dict)
+        return decoded[1].head(cnt)
+    if (task := inflight.get(cell)) is None:
+        task = inflight[cell] = asyncio.ensure_future(fetch_forecast(geo, cell))
+        task.add_done_callback(lambda _: inflight.pop(cell, None))
+    return (await asyncio.shield(task)).head(cnt)
+
+
+async def fetch_forecast(geo: list[float], cell: int) -> Forecast:
+    """
+    Запрашивает полный прогноз на 5 дней для ячейки. Одновременные запросы одной ячейки объединяются
+    в `get_weather_5_days` в одну задачу. Если API недоступно, возвращается последний прогноз из кэша с `as_of`.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    :param cell: Идентификатор гео-ячейки.
+    :type cell: int
+
+    :return: Колоночный прогноз погоды на 40 отсчётов.
+    :rtype: Forecast
 
     :raises ValueError: Если координаты недействителен или на сервере внутренняя ошибка.
     :raises ConnectionError: Если возникает проблема с подключением к API OpenWeatherMap.
     """
 
-    async with ClientSession() as session:
-        params = {'lon': geo[0], 'lat': geo[1], 'units': 'metric', 'lang': 'ru', 'appid': get('APIKEY_WEATHER')}
-        async with session.get('https://api.openweathermap.org/data/2.5/weather', params=params) as resp:
-            r_dict = await resp.json()
-            if resp.status == 200:
-                if r_dict['cod'] == 200:
-                    return extract_weather_data(r_dict), {
-                        'sunrise': datetime.fromtimestamp(r_dict['sys']['sunrise']).time(),
-                        'sunset': datetime.fromtimestamp(r_dict['sys']['sunset']).time()
-                    }
-                raise ValueError
-            raise ConnectionError
-
-
-async def get_weather_5_days(geo: list[float], cnt: int = 40) -> list:
-    async with ClientSession() as session:
-        params = {'lon': geo[0], 'lat': geo[1], 'cnt': cnt, 'units': 'metric',
-                  'lang': 'ru', 'appid': get('APIKEY_WEATHER')}
-        async with session.get('https://api.openweathermap.org/data/2.5/forecast', params=params) as resp:
-            r_dict = await resp.json()
-            if resp.status == 200:
-                if r_dict['cod'] == '200':
-                    return [(datetime.fromtimestamp(weather['dt']), extract_weather_data(weather))
-                            for weather in r_dict['list']]
-                raise ValueError
-            raise ConnectionError
+    if (r_dict := weather_cache.get('forecast', cell, FORECAST_TTL)) is None:
+        params = {'lon': geo[0], 'lat': geo[1], 'cnt': 40, 'units': 'metric',
+                  'lang': 'ru', 'appid': settings.apikey_weather}
+        try:
+            r_dict = await owm.call(fetch_json, 'https://api.openweathermap.org/data/2.5/forecast', params)
+        except ConnectionError:
+            if (entry := weather_cache.peek('forecast', cell)) is None:
+                raise
+            forecast = Forecast.from_payload(entry[1])
+            forecast.as_of = datetime.fromtimestamp(entry[0])
+            return forecast
+        weather_cache.put('forecast', cell, r_dict)
+        decoded_forecasts[cell] = r_dict, Forecast.from_payload(r_dict)
+        history.append(cell, 'forecast', decoded_forecasts[cell][1])
+    if (decoded := decoded_forecasts.get(cell)) is None or decoded[0] is not r_dict:
+        decoded_forecasts[cell] = decoded = r_dict, Forecast.from_payload(r_dict)
+    return decoded[1]
+
+
+def prefetch_forecast(geo: list[float]):
+    """
+    Запускает в фоне загрузку прогноза на 5 дней для координат и подготовку данных соседних страниц прогноза
+    (иконки, стороны света и части суток завтрашнего дня), чтобы следующие нажатия отвечались из памяти.
+    Запрос объединяется с уже идущим для той же ячейки, а ошибки только логируются.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    """
+
+    async def warm():
+        try:
+            forecast = await get_weather_5_days(geo)
+        except (ConnectionError, ValueError) as e:
+            return logging.debug('Предзагрузка прогноза для %s не удалась: %r', geo, e)
+        tomorrow = (datetime.now() + timedelta(days=1)).date()
+        for part in DAYPARTS:
+            forecast.daypart(tomorrow, part)
+
+    task = asyncio.create_task(warm())
+    prefetches.add(task)
+    task.add_done_callback(prefetches.discard)
+
+
+async def past_weather(geo: list[float], moment: datetime) -> dict | None:
+    """
+    Возвращает погоду на прошедший момент из истории наблюдений без запроса к API: самый поздно полученный отсчёт
+    текущей погоды или прогноза на это время. Партиции читаются и распаковываются в потоке истории.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    :param moment: Время отсчёта.
+    :type moment: datetime
+
+    :return: Словарь с погодой или None, если такого отсчёта в истории нет.
+    :rtype: Union[dict, None]
+    """
+
+    timestamp = int(moment.timestamp())
+    forecast = await asyncio.get_running_loop().run_in_executor(history.executor, history.query, geo_to_cell(geo),
+                                                                timestamp, timestamp)
+    return forecast.at(moment)
 
 
 async def reverse_geocoding(geo: list[float]) -> str:
     """
     Геокодирует обратно долготу и широту местоположения в город, к которому принадлежат координаты.
-    Используется API Геокодера Яндекса.
+    Сначала ищется ближайший населённый пункт офлайн-справочника через пространственный индекс `places`, и только
+    если рядом ничего нет, используется API Геокодера Яндекса.
 
     :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
     :type geo: list[float]
@@ -76,24 +218,23 @@ async def reverse_geocoding(geo: list[float]) -> str:
     :raises ConnectionError: Если возникает проблема с подключением к API Геокодера Яндекса.
     """
 
-    async with ClientSession() as session:
-        # params = {'format': 'jsonv2', 'lon': geo[0], 'lat': geo[1]}
-        # async with session.get('https://nominatim.openstreetmap.org/reverse', params=params) as resp:
-        params = {'geocode': f'{geo[0]}, {geo[1]}', 'kind': 'locality',
-                  'apikey': get('APIKEY_GEOCODE'), 'format': 'json'}
-        async with session.get('https://geocode-maps.yandex.ru/1.x', params=params) as resp:
-            resp_dict = await resp.json()
-            if resp.status == 200:
-                if resp_dict['response']['GeoObjectCollection']['featureMember']:
-                    return resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['name']
-                raise ValueError
-            raise ConnectionError
+    if city := places.nearest(geo):
+        return city
+    # params = {'format': 'jsonv2', 'lon': geo[0], 'lat': geo[1]}
+    # resp_dict = await fetch_json('https://nominatim.openstreetmap.org/reverse', params)
+    params = {'geocode': f'{geo[0]}, {geo[1]}', 'kind': 'locality', 'apikey': settings.apikey_geocode, 'format': 'json'}
+    resp_dict = await yandex.call(fetch_json, 'https://geocode-maps.yandex.ru/1.x', params)
+    if resp_dict['response']['GeoObjectCollection']['featureMember']:
+        return resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['name']
+    raise ValueError
 
 
 async def geocoding(city: str) -> tuple[tuple[float], str]:
     """
     Геокодирует город в долготу и широту своего местоположения.
-    Используется API Геокодера Яндекса.
+    Сначала название ищется в офлайн-справочнике `gazetteer` по точному совпадению, незнакомые ему названия
+    отправляются в API Геокодера Яндекса, и только если Яндекс ничего не нашёл или недоступен, справочник ищет
+    по префиксу и с опечатками.
 
     :param city: Строка, представляющая название города.
     :type city: str
@@ -105,19 +246,22 @@ async def geocoding(city: str) -> tuple[tuple[float], str]:
     :raises ConnectionError: Если возникает проблема с подключением к API Геокодера Яндекса.
     """
 
-    async with ClientSession() as session:
-        params = {'geocode': city, 'apikey': get('APIKEY_GEOCODE'), 'format': 'json'}
-        async with session.get('https://geocode-maps.yandex.ru/1.x', params=params) as resp:
-            resp_dict = await resp.json()
-            if resp.status == 200:
-                if resp_dict['response']['GeoObjectCollection']['featureMember']:
-                    geo = resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['Point']['pos']
-                    return (
-                        tuple(map(float, geo.split())),
-                        resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['name']
-                    )
-                raise ValueError
-            raise ConnectionError
+    if found := gazetteer.lookup(city):
+        return found
+    params = {'geocode': city, 'apikey': settings.apikey_geocode, 'format': 'json'}
+    try:
+        resp_dict = await yandex.call(fetch_json, 'https://geocode-maps.yandex.ru/1.x', params)
+        if not resp_dict['response']['GeoObjectCollection']['featureMember']:
+            raise ValueError
+    except (ConnectionError, ValueError):
+        if found := gazetteer.lookup(city, fuzzy=True):
+            return found
+        raise
+    geo = resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['Point']['pos']
+    return (
+        tuple(map(float, geo.split())),
+        resp_dict['response']['GeoObjectCollection']['featureMember'][0]['GeoObject']['name']
+    )
 
 
 async def get_tzshift(geo: list[float]) -> int:
@@ -135,12 +279,8 @@ async def get_tzshift(geo: list[float]) -> int:
     :raises ConnectionError: Если возникает проблема с подключением к API TimeZoneDB.
     """
 
-    async with ClientSession() as session:
-        params = {'key': get('APIKEY_TIMEZONE'), 'format': 'json', 'by': 'position', 'lng': geo[0], 'lat': geo[1]}
-        async with session.get('http://api.timezonedb.com/v2.1/get-time-zone', params=params) as resp:
-            resp_dict = await resp.json()
-            if resp.status == 200:
-                if resp_dict['status'] == 'OK':
-                    return resp_dict['gmtOffset'] // 3600 - 3
-                raise ValueError
-            raise ConnectionError
+    params = {'key': settings.apikey_timezone, 'format': 'json', 'by': 'position', 'lng': geo[0], 'lat': geo[1]}
+    resp_dict = await timezonedb.call(fetch_json, 'http://api.timezonedb.com/v2.1/get-time-zone', params)
+    if resp_dict['status'] == 'OK':
+        return resp_dict['gmtOffset'] // 3600 - 3
+    raise ValueError
@@ -1,19 +1,21 @@
+import logging
 from contextlib import suppress
-from datetime import datetime, timedelta
+from datetime import datetime, time
 from random import choice
 
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import BaseFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State
-from aiogram.fsm.storage.base import StorageKey
-from aiogram.types import CallbackQuery, InlineKeyboardButton as Button, Message
+from aiogram.types import (CallbackQuery, InlineKeyboardButton as Button, InlineKeyboardMarkup, Message,
+                           ReplyKeyboardRemove)
 from aiogram.utils.keyboard import InlineKeyboardBuilder as Board
 
-from loader import ADMINS, bot, db, storage
-from tools.api import get_weather
+from loader import ADMINS, bot, db, ephemeral
+from tools.api import get_weather, places
 from tools.converters import inflect_city
-from entities import FORECAST, SUN_DESC
+from tools.sun import MSK_OFFSET, local_now, sun_times
+from entities import FORECAST, STALE_FORECAST, SUN_DESC
 
 
 class AdminFilter(BaseFilter):
@@ -29,13 +31,13 @@ class AdminFilter(BaseFilter):
         :return: Булево, указывающее, является ли администратором пользователь, создавший resp.
         :rtype: bool
         """
-        return await (resp.chat.id if isinstance(resp, Message) else resp.message.chat.id) in ADMINS
+        return (resp.chat.id if isinstance(resp, Message) else resp.message.chat.id) in ADMINS
 
 
 async def set_state(ctx: FSMContext, state: State):
     """
-    Устанавливает состояние пользователя в хранилище контекста FSMContext и обновляет состояние в базе данных для
-    синхронизации.
+    Устанавливает состояние пользователя в хранилище контекста FSMContext и дублирует его в хранилище временных
+    состояний для восстановления после перезапуска.
 
     :param ctx: Объект FSMContext.
     :type ctx: FSMContext
@@ -44,35 +46,51 @@ async def set_state(ctx: FSMContext, state: State):
     """
 
     await ctx.set_state(state)
-    await db.set_state(ctx.key.chat_id, 'aiogram_state', str(state).split("'")[1])
+    await ephemeral.set_state(ctx.key.chat_id, 'aiogram_state', str(state).split("'")[1])
 
 
 async def delete_state(ctx: FSMContext):
     """
-    Очищает состояние пользователя в хранилище контекста FSMContext и все временные состояния из базы данных.
+    Очищает состояние пользователя в хранилище контекста FSMContext и все его временные состояния диалогов.
+    Временные состояния удаляются первыми, иначе `BoundedStorage` восстановит из них только что очищенное
+    состояние aiogram.
 
     :param ctx: Объект FSMContext, состояния которого необходимо очистить.
     :type ctx: FSMContext
     """
 
+    await ephemeral.clear(ctx.key.chat_id)
     await ctx.clear()
-    for key in ['aiogram_state', 'main_msg_id', 'from', 'set_h', 'set_m']:
-        try:
-            await db.delete_state(ctx.key.chat_id, key)
-        except (ValueError, KeyError):
-            pass
 
 
-async def restore_states():
+async def reresolve_cities() -> int:
     """
-    Восстанавливает состояние всех пользователей, получая их состояния из базы данных и устанавливая их в хранилище.
-    Полезно при неожиданном падении чат-бота — после перезапуска все состояния будут сохранены.
+    Заново определяет города всех пользователей с местоположением по офлайн-справочнику за один пакетный проход,
+    например, после обновления набора населённых пунктов. Пользователи, для которых рядом ничего не найдено,
+    сохраняют прежний город.
+
+    :return: Количество пользователей, у которых изменился город.
+    :rtype: int
     """
 
-    users = await db.get_users()
-    for user in users:
-        if state := user.state.get('aiogram_state'):
-            await storage.set_state(bot, StorageKey(bot.id, user.tg_id, user.tg_id), state)
+    users = [user for user in await db.get_users() if user.geo]
+    changed = 0
+    for user, city in zip(users, places.nearest_many([user.geo for user in users])):
+        if city and city != user.state.get('city'):
+            await db.set_state(user.tg_id, 'city', city)
+            changed += 1
+    return changed
+
+
+async def remove_reply_keyboard(chat_id: int):
+    """
+    Убирает reply-клавиатуру в чате, отправляя и сразу удаляя служебное сообщение.
+
+    :param chat_id: ID чата в Telegram.
+    :type chat_id: int
+    """
+    service_msg = await bot.send_message(chat_id, 'ㅤ', reply_markup=ReplyKeyboardRemove())
+    await service_msg.delete()
 
 
 async def notify_admins(text: str):
@@ -88,21 +106,39 @@ async def notify_admins(text: str):
             await bot.send_message(admin, text)
 
 
-async def get_greeting(uid: int, with_city: bool = True) -> str:
+async def get_greeting(uid: int, with_city: bool = True) -> tuple[str, str]:
     """
     Генерирует уникальное приветствие для пользователя, используя город и часовой пояс с текущим временем.
 
     :param uid: Telegram ID пользователя для поиска пользователя в базе данных, если он там записан.
     :type uid: int
 
-    :return: Строка, содержащая приветствие для пользователя, основанное на его местном времени и городе.
-    :rtype: str
+    :return: Кортеж из приветствия для пользователя, основанного на его местном времени и городе, и иконки.
+    :rtype: tuple[str, str]
     """
 
     user = await db.get_user(uid)
-    if (tz_shift := user.state.get('tz_shift')) is None:
+    return make_greeting(user.state.get('tz_shift'), user.state.get('city'), with_city)
+
+
+def make_greeting(tz_shift: int | None, city: str | None, with_city: bool = True) -> tuple[str, str]:
+    """
+    Генерирует приветствие по уже загруженным часовому поясу и городу пользователя, не обращаясь к базе данных.
+
+    :param tz_shift: Сдвиг часового пояса пользователя относительно московского времени или None, если он неизвестен.
+    :type tz_shift: Union[int, None]
+    :param city: Город пользователя.
+    :type city: Union[str, None]
+    :param with_city: Добавлять ли город в приветствие.
+    :type with_city: bool
+
+    :return: Кортеж из приветствия и иконки.
+    :rtype: tuple[str, str]
+    """
+
+    if tz_shift is None:
         return choice(['Привет', 'Приветик', 'Приветствую', 'Хэллоу', 'Хай', 'Йоу', 'Салют']), ''
-    local_time, city = (datetime.now() + timedelta(hours=tz_shift)).time(), user.state.get('city')
+    local_time = local_now(tz_shift).time()
 
     if 5 <= local_time.hour <= 11:
         greet = choice(['Доброе утро', 'Доброго утра', 'Доброе утречко', 'Доброго утречка', 'Утречко', 'Утро доброе',
@@ -122,22 +158,105 @@ async def get_greeting(uid: int, with_city: bool = True) -> str:
     return (f"{greet} в {inflect_city(city, {'loct'})}" if with_city else greet), icon
 
 
-async def send_notifies():
+def sun_text(sun_status: dict, local_time: time) -> str:
     """
-    Вызывается каждую минуту через AsyncIOScheduler и отправляет уведомления тем, кто поставил его на текущее время.
+    Формирует абзац о восходе и закате Солнца для прогноза погоды.
+
+    :param sun_status: Словарь с местным временем восхода ('sunrise') и заката ('sunset').
+    :type sun_status: dict
+    :param local_time: Текущее местное время пользователя.
+    :type local_time: datetime.time
+
+    :return: Абзац с отступом перед ним или пустая строка во время полярного дня или ночи.
+    :rtype: str
+    """
+
+    if sun_status['sunrise'] is None:
+        return ''
+    sun_status_verbs = {'verb_sr': 'был' if local_time > sun_status['sunrise'] else 'будет',
+                        'verb_ss': 'был' if local_time > sun_status['sunset'] else 'будет'}
+    return '\n\n' + SUN_DESC.format(**(sun_status | sun_status_verbs))
+
+
+def stale_text(as_of: datetime | None) -> str:
+    """
+    Формирует пометку о том, что прогноз взят из кэша, пока провайдер погоды недоступен.
+
+    :param as_of: Время получения данных из кэша или None, если данные свежие.
+    :type as_of: Union[datetime, None]
+
+    :return: Абзац с отступом перед ним или пустая строка для свежих данных.
+    :rtype: str
+    """
+
+    return '' if as_of is None else '\n\n' + STALE_FORECAST.format(as_of)
+
+
+async def fetch_notify_weather(due: list[tuple]) -> dict[tuple, dict]:
+    """
+    Получает погоду один раз для каждой группы получателей уведомлений с одинаковыми гео-ячейкой, городом и часовым
+    поясом. Восход и закат вычисляются пакетно для всех групп сразу и добавляются в словарь погоды.
+
+    :param due: Строки снимка получателей (tg_id, lon, lat, tz_shift, cell, city, tenant).
+    :type due: list[tuple]
+
+    :return: Словарь, сопоставляющий ключ группы (cell, city, tz_shift) словарю погоды. Группы, для которых погода
+             недоступна, пропускаются.
+    :rtype: dict[tuple, dict]
+    """
+
+    places = {(cell, city, tz_shift): [lon, lat] for _, lon, lat, tz_shift, cell, city, _ in due}
+    keys = list(places)
+    suns = sun_times([places[key] for key in keys], [key[2] + MSK_OFFSET for key in keys],
+                     [local_now(key[2]).date() for key in keys])
+    weathers = {}
+    for key, (sunrise, sunset) in zip(keys, suns):
+        try:
+            weathers[key] = await get_weather(places[key]) | {'sunrise': sunrise, 'sunset': sunset}
+        except (ConnectionError, ValueError) as e:
+            logging.error('Погода для ячейки %s недоступна, уведомления пропущены: %r', key[0], e)
+    return weathers
+
+
+def render_notify_body(key: tuple, weather: dict) -> str:
+    """
+    Формирует общий для группы получателей текст прогноза в уведомлении.
+
+    :param key: Ключ группы (cell, city, tz_shift).
+    :type key: tuple
+    :param weather: Словарь погоды группы с временем восхода и заката.
+    :type weather: dict
+
+    :return: Текст прогноза без приветствия.
+    :rtype: str
+    """
+
+    _, city, tz_shift = key
+    context = {'adverb': 'Сегодня', 'verb': 'будет ', 'feels_verb': 'ощущается'}
+    text = FORECAST.format(**({'city': inflect_city(city, {'loct'})} | weather | context))
+    text += sun_text({'sunrise': weather['sunrise'], 'sunset': weather['sunset']}, local_now(tz_shift).time())
+    return text + stale_text(weather.get('as_of'))
+
+
+def notify_board() -> InlineKeyboardMarkup:
+    return Board([[Button(text='Спасибо 🫂', callback_data='ok')]]).as_markup()
+
+
+def render_notifies(due: list[tuple], weathers: dict[tuple, dict]) -> list[tuple[int, int, str]]:
+    """
+    Формирует тексты уведомлений для получателей минуты. Текст прогноза формируется один раз на группу получателей,
+    для каждого получателя добавляется только приветствие. Получатели групп без погоды пропускаются.
+    Выполняется и в основном процессе, и в процессах-воркерах `tools.workers`.
+
+    :param due: Строки снимка получателей (tg_id, lon, lat, tz_shift, cell, city, tenant).
+    :type due: list[tuple]
+    :param weathers: Погода для групп получателей.
+    :type weathers: dict[tuple, dict]
+
+    :return: Список кортежей (ID бота-арендатора, Telegram ID получателя, текст уведомления).
+    :rtype: list[tuple[int, int, str]]
     """
 
-    users = await db.get_users()
-    now = datetime.now().time()
-    for user in users:
-        for nt in user.notify_time:
-            if user.geo and (nt.hour, nt.minute) == (now.hour + user.state.get('tz_shift'), now.minute):
-                weather, sun_status = await get_weather(user.geo)
-                context = {'adverb': 'Сегодня', 'verb': 'будет ', 'feels_verb': 'ощущается'}
-                text = FORECAST.format(**({'city': inflect_city(user.state['city'], {'loct'})} | weather | context))
-                sun_status_verbs = {'verb_sr': 'был' if datetime.now().time() > sun_status['sunrise'] else 'будет',
-                                    'verb_ss': 'был' if datetime.now().time() > sun_status['sunset'] else 'будет'}
-                text += '\n\n' + SUN_DESC.format(**(sun_status | sun_status_verbs))
-                board = Board([[Button(text='Спасибо 🫂', callback_data='ok')]]).as_markup()
-                await bot.send_message(user.tg_id, f'{"! ".join(await get_greeting(user.tg_id, False))}\n\n{text}',
-                                       reply_markup=board)
+    bodies = {key: render_notify_body(key, weather) for key, weather in weathers.items()}
+    return [(tenant_id, tg_id, f'{"! ".join(make_greeting(tz_shift, city, False))}\n\n{bodies[(cell, city, tz_shift)]}')
+            for tg_id, _, _, tz_shift, cell, city, tenant_id in due if (cell, city, tz_shift) in bodies]
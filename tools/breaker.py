@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from aiohttp import ClientError
+
+
+class CircuitOpenError(ConnectionError):
+    """Ошибка, возникающая при обращении к провайдеру, цепь которого разомкнута после череды сбоев."""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для внешнего провайдера. Ограничивает время ответа бюджетом задержки, дублирует медленный запрос
+    (hedged request) и после `threshold` сбоев подряд размыкает цепь на `reset_timeout` секунд: все вызовы в это время
+    сразу завершаются ошибкой `CircuitOpenError`, а после паузы пропускается один пробный вызов.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, reset_timeout: float = 30, budget: float = 5,
+                 hedge_after: float = 1.5):
+        """
+        Инициализирует предохранитель в замкнутом состоянии.
+
+        :param name: Название провайдера для логов.
+        :type name: str
+        :param threshold: Количество сбоев подряд, после которого цепь размыкается.
+        :type threshold: int
+        :param reset_timeout: Время в секундах, на которое размыкается цепь.
+        :type reset_timeout: float
+        :param budget: Максимальное время в секундах на один вызов вместе с дублирующим запросом.
+        :type budget: float
+        :param hedge_after: Время в секундах, после которого медленный запрос дублируется.
+        :type hedge_after: float
+        """
+        self.name, self.threshold, self.reset_timeout = name, threshold, reset_timeout
+        self.budget, self.hedge_after = budget, hedge_after
+        self.failures, self.opened_at, self.probing = 0, None, False
+        self.calls = self.errors = self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    async def call(self, func: Callable[..., Awaitable], *args):
+        """
+        Вызывает провайдера через предохранитель.
+
+        :param func: Асинхронная функция запроса к провайдеру. Должна быть идемпотентной, так как может быть вызвана
+                     дважды.
+        :type func: Callable[..., Awaitable]
+        :param args: Аргументы функции запроса.
+
+        :return: Результат функции запроса.
+
+        :raises CircuitOpenError: Если цепь разомкнута.
+        :raises ConnectionError: Если провайдер не ответил в бюджет задержки или вернул ошибку.
+        :raises ValueError: Если провайдер отклонил запрос. Такой ответ не считается сбоем и не размыкает цепь.
+        """
+        if (state := self.state) == 'open' or state == 'half-open' and self.probing:
+            self.rejected += 1
+            raise CircuitOpenError(self.name)
+        self.probing = state == 'half-open'
+        self.calls += 1
+        try:
+            result = await asyncio.wait_for(self._hedged(func, *args), self.budget)
+        except (ConnectionError, ClientError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            self._failure()
+            raise ConnectionError(self.name) from e
+        finally:
+            self.probing = False
+        self.failures, self.opened_at = 0, None
+        return result
+
+    async def _hedged(self, func: Callable[..., Awaitable], *args):
+        pending = {asyncio.ensure_future(func(*args))}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_after)
+            if not done:
+                pending.add(asyncio.ensure_future(func(*args)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            if self.opened_at is None or self.state == 'half-open':
+                logging.warning('Цепь провайдера %s разомкнута после %s сбоев', self.name, self.failures)
+            self.opened_at = time.monotonic()
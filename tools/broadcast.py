@@ -0,0 +1,112 @@
+import asyncio
+import html
+import logging
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from entities import BROADCAST_DONE
+from loader import bot, db
+from tenants import tenant
+from tools.bot import notify_admins
+from tools.priority import pools
+from tools.throttle import TELEGRAM_RATE, RateLimiter
+
+PAGE = 200
+limiter, tasks = RateLimiter(TELEGRAM_RATE, TELEGRAM_RATE), set()
+
+
+async def deliver(tg_id: int, text: str, reply_markup: InlineKeyboardMarkup = None) -> str:
+    """
+    Отправляет одно сообщение рассылки или уведомление с соблюдением общего лимита частоты Telegram, повторяя попытку
+    после `TelegramRetryAfter`.
+
+    :param tg_id: Telegram ID получателя.
+    :type tg_id: int
+    :param text: Текст сообщения.
+    :type text: str
+    :param reply_markup: Inline-клавиатура сообщения (необязательно).
+    :type reply_markup: InlineKeyboardMarkup
+
+    :return: Итог доставки: 'sent', 'blocked' или 'failed'.
+    :rtype: str
+    """
+
+    while True:
+        await limiter.acquire()
+        try:
+            await bot.send_message(tg_id, text, reply_markup=reply_markup)
+            return 'sent'
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+        except TelegramForbiddenError:
+            return 'blocked'
+        except TelegramBadRequest:
+            return 'failed'
+
+
+async def run_broadcast(broadcast_id: int):
+    """
+    Выполняет рассылку по всем пользователям бота-арендатора, от имени которого она создана: постранично читает
+    Telegram ID из базы данных, отправляет страницу с ограниченной конкурентностью и после каждой страницы
+    записывает прогресс, чтобы рассылку можно было продолжить после падения бота. Текст рассылки отправляется как
+    есть, без разметки HTML, а сетевые и серверные ошибки Telegram засчитываются как недоставленные сообщения.
+
+    :param broadcast_id: Идентификатор рассылки.
+    :type broadcast_id: int
+    """
+
+    broadcast = await db.get_broadcast(broadcast_id)
+    if broadcast.tenant not in bot.bots:
+        return logging.warning('broadcast %s skipped: tenant bot %s is no longer configured', broadcast_id,
+                               broadcast.tenant)
+    tenant.set(broadcast.tenant)
+    text, after = html.escape(broadcast.text), broadcast.last_tg_id
+    counts = {'sent': broadcast.sent, 'blocked': broadcast.blocked, 'failed': broadcast.failed}
+
+    async def bounded(tg_id: int) -> str:
+        async with pools.slot('broadcast'):
+            try:
+                return await deliver(tg_id, text)
+            except TelegramAPIError as e:
+                logging.warning('broadcast %s: message for %s failed: %r', broadcast_id, tg_id, e)
+                return 'failed'
+
+    while tg_ids := await db.get_user_ids(after, PAGE):
+        for result in await asyncio.gather(*map(bounded, tg_ids)):
+            counts[result] += 1
+        after = tg_ids[-1]
+        await db.update_broadcast(broadcast_id, last_tg_id=after, **counts)
+        logging.info('broadcast %s: %s users done, last tg_id %s', broadcast_id, sum(counts.values()), after)
+
+    await db.update_broadcast(broadcast_id, done=True)
+    await notify_admins(BROADCAST_DONE.format(**counts))
+
+
+def spawn(broadcast_id: int):
+    task = asyncio.create_task(run_broadcast(broadcast_id))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def start_broadcast(text: str) -> int:
+    """
+    Создаёт рассылку и запускает её в фоне, не блокируя обработку обновлений.
+
+    :param text: Текст рассылки.
+    :type text: str
+
+    :return: Идентификатор рассылки.
+    :rtype: int
+    """
+
+    broadcast_id = await db.create_broadcast(text)
+    spawn(broadcast_id)
+    return broadcast_id
+
+
+async def resume_broadcasts():
+    """Продолжает в фоне рассылки, прерванные перезапуском бота, с последней записанной страницы."""
+
+    for broadcast in await db.get_unfinished_broadcasts():
+        spawn(broadcast.id)
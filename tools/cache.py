@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WeatherCache:
+    """
+    Персистентный кэш ответов OpenWeatherMap по гео-ячейкам, хранящийся в локальной SQLite-базе.
+    Переживает перезапуски бота: записи подгружаются с диска лениво, при первом обращении к ячейке. В памяти держатся
+    не больше `size` последних использованных записей. Новые ответы записываются на диск пачками раз в `flush_after`
+    секунд в отдельном потоке со своим соединением, чтобы запись и `commit` не блокировали цикл событий.
+    """
+
+    def __init__(self, path: str, size: int = 1000, flush_after: float = 1.0):
+        """
+        Инициализирует кэш без открытия файла — соединение создаётся при первом обращении.
+
+        :param path: Путь к файлу SQLite-базы кэша.
+        :type path: str
+        :param size: Максимальное количество записей в памяти.
+        :type size: int
+        :param flush_after: Время в секундах, за которое новые ответы собираются в одну запись на диск.
+        :type flush_after: float
+        """
+        self.path, self.size, self.flush_after = path, size, flush_after
+        self.connection = self.writer_connection = None
+        self.entries, self.pending = OrderedDict(), {}
+        self.writer, self.flushing = ThreadPoolExecutor(1, 'weather-cache'), False
+        self.hits = self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS weather (kind TEXT, cell INTEGER, fetched_at REAL, '
+                                    'payload TEXT, PRIMARY KEY (kind, cell))')
+        return self.connection
+
+    def _remember(self, key: tuple[str, int], entry: tuple[float, dict] | None):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def peek(self, kind: str, cell: int) -> tuple[float, dict] | None:
+        """
+        Возвращает последнюю запись кэша для ячейки вне зависимости от её возраста.
+
+        :param kind: Тип ответа: 'weather' (текущая погода) или 'forecast' (прогноз на 5 дней).
+        :type kind: str
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+
+        :return: Кортеж из времени получения (UNIX-время) и ответа API или None, если записи нет.
+        :rtype: Union[tuple[float, dict], None]
+        """
+        if (key := (kind, cell)) in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if (entry := self.pending.get(key)) is None:
+            row = self._connect().execute('SELECT fetched_at, payload FROM weather WHERE kind = ? AND cell = ?',
+                                          key).fetchone()
+            entry = (row[0], json.loads(row[1])) if row else None
+        self._remember(key, entry)
+        return entry
+
+    def get(self, kind: str, cell: int, ttl: float) -> dict | None:
+        """
+        Возвращает ответ API из кэша, если он получен не раньше, чем `ttl` секунд назад.
+
+        :param kind: Тип ответа: 'weather' или 'forecast'.
+        :type kind: str
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+        :param ttl: Время жизни записи в секундах.
+        :type ttl: float
+
+        :return: Ответ API или None, если записи нет или она устарела.
+        :rtype: Union[dict, None]
+        """
+        if (entry := self.peek(kind, cell)) and time.time() - entry[0] <= ttl:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+    def put(self, kind: str, cell: int, payload: dict):
+        """
+        Сохраняет свежий ответ API в памяти с текущим временем получения и ставит его в очередь на запись на диск.
+        Вызывается из цикла событий.
+
+        :param kind: Тип ответа: 'weather' или 'forecast'.
+        :type kind: str
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+        :param payload: Ответ API в виде словаря.
+        :type payload: dict
+        """
+        self._remember((kind, cell), entry := (time.time(), payload))
+        self.pending[(kind, cell)] = entry
+        if not self.flushing:
+            self.flushing = True
+            asyncio.get_running_loop().call_later(self.flush_after, self._flush)
+
+    def _flush(self):
+        rows, self.pending, self.flushing = self.pending, {}, False
+        self.writer.submit(self._write, rows)
+
+    def _write(self, rows: dict[tuple[str, int], tuple[float, dict]]):
+        try:
+            if self.writer_connection is None:
+                self.writer_connection = sqlite3.connect(self.path)
+                self.writer_connection.execute('PRAGMA journal_mode=WAL')
+                self.writer_connection.execute('CREATE TABLE IF NOT EXISTS weather (kind TEXT, cell INTEGER, '
+                                               'fetched_at REAL, payload TEXT, PRIMARY KEY (kind, cell))')
+            with self.writer_connection:
+                self.writer_connection.executemany(
+                    'INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?)',
+                    [(kind, cell, fetched_at, json.dumps(payload, ensure_ascii=False))
+                     for (kind, cell), (fetched_at, payload) in rows.items()]
+                )
+        except sqlite3.Error:
+            logging.exception('Не удалось записать на диск %s ответов кэша погоды', len(rows))
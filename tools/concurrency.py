@@ -0,0 +1,28 @@
+import asyncio
+from typing import Awaitable
+
+
+async def gather_strict(*aws: Awaitable) -> list:
+    """
+    Конкурентно выполняет независимые операции в рамках хендлера и возвращает их результаты в порядке передачи.
+    В отличие от `asyncio.gather`, при первой ошибке отменяет все ещё не завершённые операции, дожидается их отмены
+    и только затем пробрасывает ошибку дальше, так что после выхода из функции ни одна операция не висит в фоне.
+    Операции, которые обязаны завершиться даже при ошибке соседей, можно обернуть в `asyncio.shield`.
+
+    :param aws: Корутины или другие awaitable-объекты.
+    :type aws: Awaitable
+
+    :return: Список результатов операций.
+    :rtype: list
+
+    :raises Exception: Первая ошибка, возникшая в любой из операций.
+    """
+
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
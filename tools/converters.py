@@ -1,8 +1,10 @@
+from datetime import date, datetime, time, timedelta
 from typing import Iterable
 
+from pymorphy2 import MorphAnalyzer
 from pymorphy2.shapes import restore_capitalization
 
-from loader import morph
+morph = MorphAnalyzer()
 
 
 def degrees_to_side(deg: float) -> str:
@@ -34,6 +36,37 @@ def degrees_to_side(deg: float) -> str:
         return 'северо-западный'
 
 
+def geo_to_cell(geo: list[float], step: float = 0.1) -> int:
+    """
+    Переводит координаты в идентификатор гео-ячейки сетки с шагом `step` градусов (по умолчанию ~11 км), чтобы
+    пользователи из одного места разделяли одни и те же данные о погоде.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    :param step: Шаг сетки в градусах.
+    :type step: float
+    :return: Целое число, однозначно задающее ячейку сетки.
+    :rtype: int
+    """
+
+    return round((geo[1] + 90) / step) * round(360 / step + 1) + round((geo[0] + 180) / step)
+
+
+def shift_time(t: time, hours: int) -> time:
+    """
+    Сдвигает время суток на заданное количество часов с переходом через полночь.
+
+    :param t: Время суток.
+    :type t: datetime.time
+    :param hours: Сдвиг в часах, может быть отрицательным.
+    :type hours: int
+    :return: Сдвинутое время суток.
+    :rtype: datetime.time
+    """
+
+    return (datetime.combine(date(2000, 1, 1), t) + timedelta(hours=hours)).time()
+
+
 def weather_id_to_icon(id_: int) -> str:
     """
     По заданному идентификатору погодных условий возвращает соответствующую иконку-эмодзи.
@@ -72,6 +105,40 @@ def weather_id_to_icon(id_: int) -> str:
             return '☁️'
 
 
+SIDES = ['северный', 'северо-восточный', 'восточный', 'юго-восточный',
+         'южный', 'юго-западный', 'западный', 'северо-западный']
+SIDE_TABLE = [(degrees_to_side(deg) or SIDES[0]).capitalize() for deg in range(360)]
+ICON_TABLE = [weather_id_to_icon(id_) for id_ in range(1000)]
+
+
+def wind_sides(degs: Iterable[float]) -> list[str]:
+    """
+    Пакетно переводит углы направления ветра в названия сторон света с заглавной буквы через заранее вычисленную
+    таблицу на каждый целый градус вместо цепочки сравнений `degrees_to_side`.
+
+    :param degs: Углы в градусах.
+    :type degs: Iterable[float]
+    :return: Список названий сторон света, например, 'Северный' или 'Юго-западный'.
+    :rtype: list[str]
+    """
+
+    return [SIDE_TABLE[int(deg) % 360] for deg in degs]
+
+
+def weather_icons(ids: Iterable[int]) -> list[str]:
+    """
+    Пакетно переводит идентификаторы погодных условий OpenWeatherMap в иконки-эмодзи через заранее вычисленную таблицу
+    вместо вложенных `match` в `weather_id_to_icon`.
+
+    :param ids: Идентификаторы погодных условий по OpenWeatherMap.
+    :type ids: Iterable[int]
+    :return: Список иконок-эмодзи.
+    :rtype: list[str]
+    """
+
+    return [ICON_TABLE[id_] for id_ in ids]
+
+
 def inflect_city(text: str, required_grammemes: Iterable[str]) -> str:
     """
     Эта функция принимает название города и список тегов граммем и возвращает склонённое название города на основе
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery
+
+RENDER_PREFIXES = ('forecast', 'tomorrow forecast', 'show_', 'hide_')
+
+
+class LatestWinsMiddleware(BaseMiddleware):
+    """
+    Middleware для callback-запросов, которые только перерисовывают сообщение (листание прогноза, открытие и закрытие
+    клавиатуры часов и минут уведомления). Для каждого сообщения отслеживается обработчик, выполняющийся в данный
+    момент: новое нажатие отменяет ещё не завершённый предыдущий, а на отменённый запрос сразу отправляется пустой
+    ответ. Так при частых нажатиях отрисовывается только последнее из них, а устаревшие правки не гоняются друг
+    с другом. Обработчики, которые что-то записывают (например, выбор часа или минуты), отменять нельзя: отмена
+    потеряла бы запись, поэтому их префиксов в `RENDER_PREFIXES` нет.
+    """
+
+    def __init__(self, prefixes: tuple[str, ...] = RENDER_PREFIXES):
+        """
+        Инициализирует middleware.
+
+        :param prefixes: Префиксы callback-данных, обработчики которых можно отменять.
+        :type prefixes: tuple[str, ...]
+        """
+        self.prefixes, self.inflight = prefixes, {}
+        self.dropped = 0
+
+    async def __call__(self, handler: Callable[[CallbackQuery, dict[str, Any]], Awaitable[Any]],
+                       event: CallbackQuery, data: dict[str, Any]) -> Any:
+        if not event.data or not event.data.startswith(self.prefixes) or event.message is None:
+            return await handler(event, data)
+
+        key = (data['bot'].id, event.message.chat.id, event.message.message_id)
+        if (previous := self.inflight.get(key)) is not None:
+            previous.cancel()
+        task = self.inflight[key] = asyncio.ensure_future(handler(event, data))
+        try:
+            await asyncio.wait({task})
+        finally:
+            if self.inflight.get(key) is task:
+                del self.inflight[key]
+
+        if task.cancelled():
+            self.dropped += 1
+            logging.debug('Callback %r в чате %s вытеснен более новым нажатием', event.data, key[1])
+            with suppress(TelegramAPIError):
+                await event.answer()
+            return None
+        return task.result()
+
+
+latest_wins = LatestWinsMiddleware()
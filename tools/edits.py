@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup
+
+from loader import bot
+from tenants import tenant
+
+
+def digest(value) -> bytes:
+    """
+    Вычисляет короткий хэш отрисованного текста или клавиатуры. Клавиатура хэшируется по `repr`, который у моделей
+    aiogram включает все кнопки и их callback-данные.
+
+    :param value: Текст сообщения или клавиатура.
+
+    :return: Хэш в 16 байт.
+    :rtype: bytes
+    """
+    return blake2b(repr(value).encode(), digest_size=16).digest()
+
+
+class EditCache:
+    """
+    Слой правки сообщений бота, который помнит хэши текста и клавиатуры, последними отрисованных в каждое сообщение,
+    и пропускает вызов API Telegram, если новая отрисовка ничем не отличается. Это экономит лимит частоты отправки
+    и время на запрос, а также избавляет обработчики от ошибок «message is not modified».
+    Хранит не больше `size` сообщений, вытесняя давно не правленные. Сообщения различаются и по боту-арендатору,
+    потому что ID сообщений у разных ботов в одном чате независимы.
+    """
+
+    def __init__(self, size: int = 10000):
+        """
+        Инициализирует кэш правок.
+
+        :param size: Максимальное количество запоминаемых сообщений.
+        :type size: int
+        """
+        self.size, self.rendered = size, OrderedDict()
+        self.sent = self.skipped = 0
+
+    async def edit_text(self, chat_id: int, message_id: int, text: str,
+                        reply_markup: InlineKeyboardMarkup = None) -> bool:
+        """
+        Меняет текст и клавиатуру сообщения, если они отличаются от последних отрисованных.
+
+        :param chat_id: ID чата.
+        :type chat_id: int
+        :param message_id: ID сообщения.
+        :type message_id: int
+        :param text: Новый текст сообщения.
+        :type text: str
+        :param reply_markup: Новая inline-клавиатура (None — убрать клавиатуру).
+        :type reply_markup: InlineKeyboardMarkup
+
+        :return: True, если запрос к API был отправлен, и False, если правка пропущена.
+        :rtype: bool
+        """
+        rendered = digest(text), digest(reply_markup)
+        if self.rendered.get((tenant.get(), chat_id, message_id)) == rendered:
+            return self._skip(chat_id, message_id)
+        return await self._edit(chat_id, message_id, rendered, bot.edit_message_text(
+            text, chat_id, message_id, reply_markup=reply_markup))
+
+    async def edit_reply_markup(self, chat_id: int, message_id: int,
+                                reply_markup: InlineKeyboardMarkup = None) -> bool:
+        """
+        Меняет только клавиатуру сообщения, если она отличается от последней отрисованной.
+
+        :param chat_id: ID чата.
+        :type chat_id: int
+        :param message_id: ID сообщения.
+        :type message_id: int
+        :param reply_markup: Новая inline-клавиатура (None — убрать клавиатуру).
+        :type reply_markup: InlineKeyboardMarkup
+
+        :return: True, если запрос к API был отправлен, и False, если правка пропущена.
+        :rtype: bool
+        """
+        text, markup = self.rendered.get((tenant.get(), chat_id, message_id), (None, None))
+        if markup == (rendered := digest(reply_markup)):
+            return self._skip(chat_id, message_id)
+        return await self._edit(chat_id, message_id, (text, rendered), bot.edit_message_reply_markup(
+            chat_id, message_id, reply_markup=reply_markup))
+
+    def forget(self, chat_id: int, message_id: int):
+        """
+        Забывает отрисовку сообщения, например, после его удаления.
+
+        :param chat_id: ID чата.
+        :type chat_id: int
+        :param message_id: ID сообщения.
+        :type message_id: int
+        """
+        self.rendered.pop((tenant.get(), chat_id, message_id), None)
+
+    def _skip(self, chat_id: int, message_id: int) -> bool:
+        self.rendered.move_to_end((tenant.get(), chat_id, message_id))
+        self.skipped += 1
+        return False
+
+    async def _edit(self, chat_id: int, message_id: int, rendered: tuple, request) -> bool:
+        key = tenant.get(), chat_id, message_id
+        try:
+            await request
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in str(e):
+                self.rendered.pop(key, None)
+                raise
+        self.rendered[key] = rendered
+        self.rendered.move_to_end(key)
+        if len(self.rendered) > self.size:
+            self.rendered.popitem(last=False)
+        self.sent += 1
+        return True
+
+
+edits = EditCache()
@@ -0,0 +1,183 @@
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime
+from functools import cached_property
+
+from tools.converters import ICON_TABLE, SIDE_TABLE, weather_icons, wind_sides
+
+HPA_TO_MMHG = 0.750064
+# Часть суток: (наречие, часы, иконка вместо самой частой или None)
+DAYPARTS = {
+    'night': ('ночью', range(0, 5), '🌃'),
+    'morning': ('утром', range(5, 12), '🌇'),
+    'day': ('днём', range(12, 18), None),
+    'evening': ('вечером', range(18, 24), '🌇')
+}
+
+
+def extract_weather_data(data: dict) -> dict:
+    return {
+        'icon': ICON_TABLE[data['weather'][0]['id']],
+        'desc': data['weather'][0]['description'],
+        'temp': data['main']['temp'],
+        'feels_like': data['main']['feels_like'],
+        'pressure': round(data['main']['pressure'] * HPA_TO_MMHG, 2),
+        'humidity': data['main']['humidity'],
+        'wind_side': SIDE_TABLE[int(data['wind']['deg']) % 360],
+        'wind_speed': data['wind']['speed'],
+        'clouds': data['clouds']['all']
+    }
+
+
+@dataclass
+class Forecast:
+    """
+    Колоночное представление прогноза погоды OpenWeatherMap: вместо словаря на каждый отсчёт каждое поле хранится
+    в отдельном плотном массиве, а иконки и стороны света вычисляются пакетно по таблицам при первом обращении.
+    Если прогноз взят из устаревшего кэша из-за недоступности провайдера, `as_of` хранит время его получения.
+    """
+
+    dt: array = field(default_factory=lambda: array('q'))
+    weather_id: array = field(default_factory=lambda: array('H'))
+    desc: list = field(default_factory=list)
+    temp: array = field(default_factory=lambda: array('d'))
+    feels_like: array = field(default_factory=lambda: array('d'))
+    pressure: array = field(default_factory=lambda: array('d'))
+    humidity: array = field(default_factory=lambda: array('B'))
+    wind_deg: array = field(default_factory=lambda: array('H'))
+    wind_speed: array = field(default_factory=lambda: array('d'))
+    clouds: array = field(default_factory=lambda: array('B'))
+    as_of = None
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> 'Forecast':
+        """
+        Раскладывает ответ API прогноза OpenWeatherMap по колонкам.
+
+        :param payload: Ответ API /data/2.5/forecast в виде словаря.
+        :type payload: dict
+
+        :return: Колоночный прогноз погоды.
+        :rtype: Forecast
+        """
+        entries = payload['list']
+        return cls(
+            array('q', [e['dt'] for e in entries]),
+            array('H', [e['weather'][0]['id'] for e in entries]),
+            [e['weather'][0]['description'] for e in entries],
+            array('d', [e['main']['temp'] for e in entries]),
+            array('d', [e['main']['feels_like'] for e in entries]),
+            array('d', [round(e['main']['pressure'] * HPA_TO_MMHG, 2) for e in entries]),
+            array('B', [e['main']['humidity'] for e in entries]),
+            array('H', [e['wind']['deg'] for e in entries]),
+            array('d', [e['wind']['speed'] for e in entries]),
+            array('B', [e['clouds']['all'] for e in entries])
+        )
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+    @cached_property
+    def times(self) -> list[datetime]:
+        return [datetime.fromtimestamp(dt) for dt in self.dt]
+
+    @cached_property
+    def icons(self) -> list[str]:
+        return weather_icons(self.weather_id)
+
+    @cached_property
+    def wind_sides(self) -> list[str]:
+        return wind_sides(self.wind_deg)
+
+    @cached_property
+    def dayparts(self) -> dict[tuple[date, str], dict]:
+        return {}
+
+    def head(self, cnt: int) -> 'Forecast':
+        """
+        Возвращает первые `cnt` отсчётов прогноза.
+
+        :param cnt: Количество отсчётов.
+        :type cnt: int
+
+        :return: Колоночный прогноз погоды из первых `cnt` отсчётов.
+        :rtype: Forecast
+        """
+        if cnt >= len(self):
+            return self
+        head = Forecast(**{f.name: getattr(self, f.name)[:cnt] for f in fields(self)})
+        head.as_of = self.as_of
+        return head
+
+    def row(self, i: int) -> dict:
+        """
+        Собирает словарь с погодой для одного отсчёта в формате, который ожидает шаблон `FORECAST`.
+
+        :param i: Индекс отсчёта.
+        :type i: int
+
+        :return: Словарь с погодой.
+        :rtype: dict
+        """
+        return {
+            'icon': self.icons[i], 'desc': self.desc[i], 'temp': self.temp[i], 'feels_like': self.feels_like[i],
+            'pressure': self.pressure[i], 'humidity': self.humidity[i], 'wind_side': self.wind_sides[i],
+            'wind_speed': self.wind_speed[i], 'clouds': self.clouds[i]
+        }
+
+    def at(self, moment: datetime) -> dict | None:
+        """
+        Возвращает погоду для отсчёта с заданным временем.
+
+        :param moment: Время отсчёта.
+        :type moment: datetime
+
+        :return: Словарь с погодой или None, если такого отсчёта в прогнозе нет.
+        :rtype: Union[dict, None]
+        """
+        return self.row(self.times.index(moment)) if moment in self.times else None
+
+    def aggregate(self, indexes: list[int]) -> dict | None:
+        """
+        Усредняет погоду по нескольким отсчётам, например, по части суток: числовые поля усредняются, а иконка,
+        описание и сторона света выбираются как самые частые.
+
+        :param indexes: Индексы отсчётов для усреднения.
+        :type indexes: list[int]
+
+        :return: Словарь с погодой или None, если отсчётов нет.
+        :rtype: Union[dict, None]
+        """
+        if not indexes:
+            return None
+        length = len(indexes)
+        mean = lambda column: sum(column[i] for i in indexes) / length
+        common = lambda column: Counter(column[i] for i in indexes).most_common(1)[0][0]
+        return {
+            'icon': common(self.icons), 'desc': common(self.desc),
+            'temp': round(mean(self.temp), 2), 'feels_like': round(mean(self.feels_like), 2),
+            'pressure': round(mean(self.pressure), 2), 'humidity': round(mean(self.humidity)),
+            'wind_side': common(self.wind_sides), 'wind_speed': round(mean(self.wind_speed), 2),
+            'clouds': round(mean(self.clouds))
+        }
+
+    def daypart(self, day: date, part: str) -> dict | None:
+        """
+        Усредняет погоду за часть суток заданного дня и подставляет иконку этой части суток.
+        Результат запоминается, так что повторные запросы той же части суток отвечаются из памяти.
+
+        :param day: День.
+        :type day: date
+        :param part: Часть суток: ключ `DAYPARTS`.
+        :type part: str
+
+        :return: Словарь с погодой или None, если отсчётов этой части суток в прогнозе нет.
+        :rtype: Union[dict, None]
+        """
+        if (day, part) not in self.dayparts:
+            _, hours, icon = DAYPARTS[part]
+            weather = self.aggregate([i for i, t in enumerate(self.times) if t.date() == day and t.hour in hours])
+            self.dayparts[(day, part)] = weather | {'icon': icon} if weather and icon else weather
+        weather = self.dayparts[(day, part)]
+        return dict(weather) if weather is not None else None
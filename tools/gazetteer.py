@@ -0,0 +1,352 @@
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+MAGIC = b'GZT1'
+HEADER, PLACE, KEY = struct.Struct('<4sII'), struct.Struct('<ffIII'), struct.Struct('<IHI')
+CASES = ['nomn', 'gent', 'datv', 'accs', 'ablt', 'loct']
+PREFIX_LIMIT, FUZZY_LIMIT = 2000, 5000
+EARTH_RADIUS = 6371.0
+RUSSIAN, LATIN = 'абвгдежзийклмнопрстуфхцчшщъыьэюя ', 'abcdefghijklmnopqrstuvwxyz '
+CYRILLIC = re.compile('[а-яё]', re.I)
+
+
+def normalize(name: str) -> str:
+    """
+    Приводит название населённого пункта к ключу индекса: нижний регистр, «ё» → «е», дефисы и повторяющиеся
+    пробелы заменяются одним пробелом.
+
+    :param name: Название населённого пункта.
+    :type name: str
+
+    :return: Нормализованный ключ.
+    :rtype: str
+    """
+    return ' '.join(name.lower().replace('ё', 'е').replace('-', ' ').split())
+
+
+def distance(a: str, b: str, limit: int) -> int:
+    """
+    Вычисляет расстояние Левенштейна между строками с ранним выходом, если оно заведомо больше `limit`.
+
+    :param a: Первая строка.
+    :type a: str
+    :param b: Вторая строка.
+    :type b: str
+    :param limit: Наибольшее интересующее расстояние.
+    :type limit: int
+
+    :return: Расстояние или `limit + 1`, если оно больше `limit`.
+    :rtype: int
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def edits(word: str) -> set[str]:
+    """
+    Перечисляет все строки на расстоянии одной правки (удаление, замена, вставка или перестановка соседних букв)
+    от слова в алфавите самого слова.
+
+    :param word: Нормализованное слово.
+    :type word: str
+
+    :return: Множество вариантов.
+    :rtype: set[str]
+    """
+    alphabet = RUSSIAN if CYRILLIC.search(word) else LATIN
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = {a + b[1:] for a, b in splits if b}
+    transposes = {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+    replaces = {a + c + b[1:] for a, b in splits if b for c in alphabet}
+    inserts = {a + c + b for a, b in splits for c in alphabet}
+    return (deletes | transposes | replaces | inserts) - {word}
+
+
+def bounds(key: str) -> tuple[bytes, bytes]:
+    return key.encode(), key.encode() + b'\x00'
+
+
+def build_index(source: str, path: str, min_population: int = 1000):
+    """
+    Собирает бинарный индекс справочника из выгрузки GeoNames (формат cities*.txt/allCountries.txt).
+    Ключами становятся название, альтернативные названия и падежные формы русского названия, полученные pymorphy2.
+
+    Формат файла: заголовок (сигнатура, количество мест и ключей), таблица мест (долгота, широта, население,
+    смещение и длина отображаемого названия), отсортированная по байтам таблица ключей (смещение, длина, номер места)
+    и блок строк UTF-8.
+
+    :param source: Путь к выгрузке GeoNames.
+    :type source: str
+    :param path: Путь к создаваемому файлу индекса.
+    :type path: str
+    :param min_population: Минимальное население, с которым место попадает в справочник.
+    :type min_population: int
+    """
+    from pymorphy2 import MorphAnalyzer
+
+    morph, places, keys = MorphAnalyzer(), [], {}
+    with open(source, encoding='utf-8') as file:
+        for line in file:
+            row = line.rstrip('\n').split('\t')
+            if row[6] != 'P' or int(row[14] or 0) < min_population:
+                continue
+            names = [row[1], row[2], *filter(None, row[3].split(','))]
+            title = next((name for name in names if CYRILLIC.search(name)), row[1])
+            forms = set(names)
+            if CYRILLIC.search(title) and ' ' not in title:
+                parsed = morph.parse(title)[0]
+                forms |= {form.word for case in CASES if (form := parsed.inflect({case}))}
+            place = len(places)
+            places.append((float(row[5]), float(row[4]), int(row[14] or 0), title))
+            for form in forms:
+                if key := normalize(form):
+                    keys.setdefault(key.encode(), set()).add(place)
+
+    blob, offsets = bytearray(), {}
+
+    def intern(data: bytes) -> int:
+        if data not in offsets:
+            offsets[data] = len(blob)
+            blob.extend(data)
+        return offsets[data]
+
+    place_table = b''.join(PLACE.pack(lon, lat, population, intern(title.encode()), len(title.encode()))
+                           for lon, lat, population, title in places)
+    key_rows = [(key, place) for key in sorted(keys) for place in sorted(keys[key])]
+    key_table = b''.join(KEY.pack(intern(key), len(key), place) for key, place in key_rows)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(places), len(key_rows)) + place_table + key_table + blob)
+
+
+class Gazetteer:
+    """
+    Офлайн-справочник населённых пунктов для прямого геокодирования без сети. Индекс, собранный `build_index`,
+    отображается в память через mmap и не читается целиком: поиск — двоичный поиск по отсортированной таблице ключей
+    (плоское представление префиксного дерева), так что точное совпадение и диапазон по префиксу находятся за
+    O(log n) обращений к странице. Если файла индекса нет, справочник считается пустым.
+    """
+
+    def __init__(self, path: str):
+        """
+        Инициализирует справочник без открытия файла — индекс отображается в память при первом поиске.
+
+        :param path: Путь к файлу индекса.
+        :type path: str
+        """
+        self.path, self.data = path, None
+        self.places = self.keys = 0
+
+    def _open(self) -> bool:
+        if self.data is None:
+            if not self.path or not os.path.exists(self.path):
+                return False
+            with open(self.path, 'rb') as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.places, self.keys = HEADER.unpack_from(self.data)
+            if magic != MAGIC:
+                raise ValueError(f'{self.path} не является индексом справочника')
+            self.key_table = HEADER.size + self.places * PLACE.size
+            self.blob = self.key_table + self.keys * KEY.size
+        return True
+
+    def key(self, i: int) -> bytes:
+        offset, length, _ = KEY.unpack_from(self.data, self.key_table + i * KEY.size)
+        return self.data[self.blob + offset:self.blob + offset + length]
+
+    def place(self, i: int) -> tuple[float, float, int, str]:
+        """
+        Возвращает место по номеру.
+
+        :param i: Номер места в индексе.
+        :type i: int
+
+        :return: Долгота, широта, население и отображаемое название.
+        :rtype: tuple[float, float, int, str]
+        """
+        lon, lat, population, offset, length = PLACE.unpack_from(self.data, HEADER.size + i * PLACE.size)
+        return lon, lat, population, self.data[self.blob + offset:self.blob + offset + length].decode()
+
+    def _range(self, low: bytes, high: bytes = None) -> range:
+        keys = _Keys(self)
+        start = bisect_left(keys, low)
+        return range(start, bisect_left(keys, high, start) if high is not None else len(keys))
+
+    def _best(self, indexes) -> tuple[tuple[float, float], str] | None:
+        places = {KEY.unpack_from(self.data, self.key_table + i * KEY.size)[2] for i in indexes}
+        if not places:
+            return None
+        lon, lat, _, title = max(map(self.place, places), key=lambda place: place[2])
+        return (round(lon, 5), round(lat, 5)), title
+
+    def lookup(self, name: str, fuzzy: bool = False) -> tuple[tuple[float, float], str] | None:
+        """
+        Ищет населённый пункт по названию: точное совпадение (включая падежные формы), а с `fuzzy` затем названия,
+        начинающиеся с введённой строки, и названия с одной-двумя опечатками. Из нескольких подходящих мест
+        выбирается самое населённое. Нечёткий поиск может подменить правильно написанное, но отсутствующее
+        в справочнике место более населённым похожим, поэтому его стоит использовать только как последнее средство.
+
+        :param name: Название, введённое пользователем.
+        :type name: str
+        :param fuzzy: Искать ли по префиксу и с опечатками, если точного совпадения нет.
+        :type fuzzy: bool
+
+        :return: Кортеж из долготы и широты и отображаемого названия или None, если ничего не найдено.
+        :rtype: Union[tuple[tuple[float, float], str], None]
+        """
+        if not self._open() or not (query := normalize(name)):
+            return None
+        key = query.encode()
+        if (found := self._best(self._range(*bounds(query)))) or not fuzzy:
+            return found
+        if len(query) >= 3 and (found := self._best(self._range(key, key + b'\xff')[:PREFIX_LIMIT])):
+            return found
+        if found := self._best(i for variant in edits(query) for i in self._range(*bounds(variant))):
+            return found
+        if len(query) >= 8:
+            head = query[:2].encode()
+            return self._best(i for i in self._range(head, head + b'\xff')[:FUZZY_LIMIT]
+                              if distance(query, self.key(i).decode(), 2) <= 2)
+
+
+def to_xyz(lon: float, lat: float) -> tuple[float, float, float]:
+    """
+    Переводит координаты в точку на единичной сфере, чтобы евклидово расстояние между точками монотонно зависело
+    от расстояния по поверхности Земли.
+
+    :param lon: Долгота в градусах.
+    :type lon: float
+    :param lat: Широта в градусах.
+    :type lat: float
+
+    :return: Координаты точки на единичной сфере.
+    :rtype: tuple[float, float, float]
+    """
+    lon, lat = math.radians(lon), math.radians(lat)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+class SpatialIndex:
+    """
+    Пространственный индекс мест справочника для офлайн-обратного геокодирования: неявное k-d дерево по точкам
+    на единичной сфере. Дерево хранится в плоских массивах — узел поддиапазона `[low, high)` лежит в его середине,
+    а ось разбиения чередуется по глубине, — и строится один раз: при запуске бота в пуле потоков через `build`,
+    а если этого не сделали, то при первом запросе.
+    """
+
+    def __init__(self, gazetteer: Gazetteer, radius: float = 30.0):
+        """
+        Инициализирует индекс без построения дерева.
+
+        :param gazetteer: Справочник, места которого индексируются.
+        :type gazetteer: Gazetteer
+        :param radius: Наибольшее расстояние до места в километрах, при котором оно считается найденным.
+        :type radius: float
+        """
+        self.gazetteer, self.radius = gazetteer, radius
+        self.points = self.order = None
+
+    def build(self) -> bool:
+        """
+        Строит дерево, если оно ещё не построено. Построение занимает около секунды на 100 тысяч мест, поэтому
+        из асинхронного кода его нужно запускать в `run_in_executor`.
+
+        :return: True, если дерево построено, и False, если справочника нет.
+        :rtype: bool
+        """
+        if self.points is None:
+            if not self.gazetteer._open():
+                return False
+            points = [to_xyz(*self.gazetteer.place(i)[:2]) for i in range(self.gazetteer.places)]
+            order = list(range(len(points)))
+            stack = [(0, len(order), 0)]
+            while stack:
+                low, high, axis = stack.pop()
+                if high - low > 1:
+                    order[low:high] = sorted(order[low:high], key=lambda i: points[i][axis])
+                    mid = (low + high) // 2
+                    stack += [(low, mid, (axis + 1) % 3), (mid + 1, high, (axis + 1) % 3)]
+            self.order = array('I', order)
+            self.points = [array('d', [points[i][axis] for i in order]) for axis in range(3)]
+        return True
+
+    def _nearest(self, point: tuple[float, float, float]) -> tuple[float, int]:
+        best, best_i = math.inf, -1
+        stack = [(0, len(self.order), 0)]
+        while stack:
+            low, high, axis = stack.pop()
+            if low >= high:
+                continue
+            mid = (low + high) // 2
+            d = sum((self.points[k][mid] - point[k]) ** 2 for k in range(3))
+            if d < best:
+                best, best_i = d, mid
+            diff = point[axis] - self.points[axis][mid]
+            near, far = ((mid + 1, high), (low, mid)) if diff > 0 else ((low, mid), (mid + 1, high))
+            if diff * diff < best:
+                stack.append((*far, (axis + 1) % 3))
+            stack.append((*near, (axis + 1) % 3))
+        return best, best_i
+
+    def nearest(self, geo: list[float]) -> str | None:
+        """
+        Находит ближайший населённый пункт к координатам.
+
+        :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+        :type geo: list[float]
+
+        :return: Название населённого пункта или None, если в радиусе `radius` ничего нет или справочника нет.
+        :rtype: Union[str, None]
+        """
+        return self.nearest_many([geo])[0]
+
+    def nearest_many(self, geos: list[list[float]]) -> list[str | None]:
+        """
+        Находит ближайшие населённые пункты для набора координат за один проход, например, чтобы заново определить
+        города всех пользователей после обновления справочника.
+
+        :param geos: Список координат (долгота, широта).
+        :type geos: list[list[float]]
+
+        :return: Названия населённых пунктов в порядке координат; None там, где в радиусе ничего нет.
+        :rtype: list[Union[str, None]]
+        """
+        if not self.build() or not self.order:
+            return [None] * len(geos)
+        chord = 2 * math.sin(self.radius / EARTH_RADIUS / 2)
+        names = []
+        for geo in geos:
+            distance_sq, i = self._nearest(to_xyz(*geo))
+            names.append(self.gazetteer.place(self.order[i])[3] if distance_sq <= chord * chord else None)
+        return names
+
+
+class _Keys:
+    """Последовательность ключей индекса для `bisect` без их чтения в память."""
+
+    def __init__(self, gazetteer: Gazetteer):
+        self.gazetteer = gazetteer
+
+    def __len__(self) -> int:
+        return self.gazetteer.keys
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.gazetteer.key(i)
+
+
+if __name__ == '__main__':
+    build_index(*sys.argv[1:3], *map(int, sys.argv[3:4]))
@@ -0,0 +1,188 @@
+import logging
+import os
+import struct
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import fields
+
+from tools.forecast import Forecast
+
+KINDS = {'weather': 0, 'forecast': 1}
+COLUMNS = [(f.name, f.default_factory().typecode) for f in fields(Forecast) if f.name != 'desc']
+HEADER, FRAME = struct.Struct('<IdB'), struct.Struct('<I')
+DAY = 24 * 60 * 60
+
+
+class ObservationHistory:
+    """
+    Append-only история погоды на локальном диске, разбитая на партиции по гео-ячейке и дню (UTC) времени отсчёта:
+    `<root>/<cell>/<YYYY-MM-DD>.zcol`. Каждая запись — сжатый zlib колоночный блок отсчётов одного ответа API
+    (текущей погоды или прогноза) со временем его получения. Блоки только дописываются в конец файла, а запрос
+    диапазона читает лишь партиции нужных дней и склеивает колонки без разбора JSON. Запись и чтение из асинхронного
+    кода идут в отдельном потоке `executor`, чтобы не блокировать цикл событий и не делить кэш партиций между
+    потоками, а партиции старше `keep_days` дней удаляются.
+    """
+
+    def __init__(self, root: str, keep_days: int = 30, cached: int = 256):
+        """
+        Инициализирует историю без обращения к диску — каталоги создаются при первой записи.
+
+        :param root: Каталог истории.
+        :type root: str
+        :param keep_days: Количество дней до текущего, партиции которых хранятся.
+        :type keep_days: int
+        :param cached: Количество разобранных партиций, которые держатся в памяти.
+        :type cached: int
+        """
+        self.root, self.keep_days, self.cached = root, keep_days, cached
+        self.partitions = OrderedDict()
+        self.executor, self.pruned = ThreadPoolExecutor(1, 'history'), 0.0
+
+    def append(self, cell: int, kind: str, forecast: Forecast, fetched_at: float = None) -> Future:
+        """
+        Ставит отсчёты ответа API в очередь на запись в потоке истории и сразу возвращает управление. Записи
+        выполняются по одной в порядке вызовов.
+
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+        :param kind: Тип ответа: 'weather' (текущая погода) или 'forecast' (прогноз на 5 дней).
+        :type kind: str
+        :param forecast: Колоночные отсчёты ответа.
+        :type forecast: Forecast
+        :param fetched_at: Время получения ответа (UNIX-время), по умолчанию — текущее.
+        :type fetched_at: float
+
+        :return: Future записи.
+        :rtype: Future
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        return self.executor.submit(self._guarded, cell, kind, forecast, fetched_at)
+
+    def _guarded(self, cell: int, kind: str, forecast: Forecast, fetched_at: float):
+        try:
+            self.write(cell, kind, forecast, fetched_at)
+            if time.time() - self.pruned >= 60 * 60:
+                self.pruned = time.time()
+                self.prune()
+        except OSError:
+            logging.exception('Не удалось записать историю наблюдений ячейки %s', cell)
+
+    def write(self, cell: int, kind: str, forecast: Forecast, fetched_at: float):
+        """
+        Синхронно дописывает отсчёты ответа API в партиции ячейки по дням.
+
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+        :param kind: Тип ответа: 'weather' (текущая погода) или 'forecast' (прогноз на 5 дней).
+        :type kind: str
+        :param forecast: Колоночные отсчёты ответа.
+        :type forecast: Forecast
+        :param fetched_at: Время получения ответа (UNIX-время).
+        :type fetched_at: float
+        """
+        days = {}
+        for i, dt in enumerate(forecast.dt):
+            days.setdefault(dt // DAY, []).append(i)
+        for day, indexes in days.items():
+            header = HEADER.pack(len(indexes), fetched_at, KINDS[kind])
+            columns = [array(typecode, [getattr(forecast, name)[i] for i in indexes]).tobytes()
+                       for name, typecode in COLUMNS]
+            desc = '\n'.join(forecast.desc[i] for i in indexes).encode()
+            block = zlib.compress(b''.join([header, *columns, desc]))
+            os.makedirs(os.path.dirname(path := self._path(cell, day)), exist_ok=True)
+            with open(path, 'ab') as file:
+                file.write(FRAME.pack(len(block)) + block)
+
+    def prune(self) -> int:
+        """
+        Удаляет партиции за дни раньше, чем `keep_days` дней назад, и опустевшие каталоги ячеек.
+
+        :return: Количество удалённых партиций.
+        :rtype: int
+        """
+        cutoff, removed = time.strftime('%Y-%m-%d.zcol', time.gmtime(time.time() - self.keep_days * DAY)), 0
+        with os.scandir(self.root) as cells:
+            for cell in cells:
+                if not cell.is_dir():
+                    continue
+                with os.scandir(cell.path) as partitions:
+                    for partition in partitions:
+                        if partition.name.endswith('.zcol') and partition.name < cutoff:
+                            os.remove(partition.path)
+                            removed += 1
+                if not os.listdir(cell.path):
+                    os.rmdir(cell.path)
+        return removed
+
+    def query(self, cell: int, start: int, end: int, kind: str = None) -> Forecast:
+        """
+        Возвращает отсчёты ячейки со временем от `start` до `end` включительно. Если на одно время есть несколько
+        отсчётов (наблюдение и прогнозы разной давности), берётся самый поздно полученный.
+
+        :param cell: Идентификатор гео-ячейки.
+        :type cell: int
+        :param start: Начало диапазона (UNIX-время).
+        :type start: int
+        :param end: Конец диапазона (UNIX-время).
+        :type end: int
+        :param kind: Тип отсчётов: 'weather', 'forecast' или None — любые.
+        :type kind: str
+
+        :return: Колоночные отсчёты, упорядоченные по времени.
+        :rtype: Forecast
+        """
+        latest = {}
+        for day in range(start // DAY, end // DAY + 1):
+            for fetched_at, code, block in self._partition(cell, day):
+                if kind is not None and code != KINDS[kind]:
+                    continue
+                for i, dt in enumerate(block.dt):
+                    if start <= dt <= end and (dt not in latest or latest[dt][0] <= fetched_at):
+                        latest[dt] = fetched_at, block, i
+        result = Forecast()
+        for dt in sorted(latest):
+            _, block, i = latest[dt]
+            for f in fields(Forecast):
+                getattr(result, f.name).append(getattr(block, f.name)[i])
+        return result
+
+    def _path(self, cell: int, day: int) -> str:
+        return os.path.join(self.root, str(cell), time.strftime('%Y-%m-%d.zcol', time.gmtime(day * DAY)))
+
+    def _partition(self, cell: int, day: int) -> list[tuple[float, int, Forecast]]:
+        try:
+            size = os.path.getsize(path := self._path(cell, day))
+        except OSError:
+            return []
+        if (cached := self.partitions.get(path)) is not None and cached[0] == size:
+            self.partitions.move_to_end(path)
+            return cached[1]
+        with open(path, 'rb') as file:
+            data = file.read()
+        blocks, offset = [], 0
+        while offset + FRAME.size <= len(data):
+            length, = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            if offset + length > len(data):
+                break
+            blocks.append(self._decode(zlib.decompress(data[offset:offset + length])))
+            offset += length
+        self.partitions[path] = size, blocks
+        if len(self.partitions) > self.cached:
+            self.partitions.popitem(last=False)
+        return blocks
+
+    @staticmethod
+    def _decode(body: bytes) -> tuple[float, int, Forecast]:
+        count, fetched_at, code = HEADER.unpack_from(body)
+        offset, columns = HEADER.size, {}
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            column.frombytes(body[offset:offset + count * column.itemsize])
+            columns[name] = column
+            offset += count * column.itemsize
+        desc = body[offset:].decode().split('\n') if count else []
+        return fetched_at, code, Forecast(**columns, desc=desc)
@@ -0,0 +1,168 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from sqlalchemy import event
+
+from loader import db, storage
+from tools.api import owm, timezonedb, weather_cache, yandex
+from tools.debounce import latest_wins
+from tools.edits import edits
+from tools.notifier import notifier
+from tools.outbox import outbox
+from tools.priority import pools
+
+
+class UpdateMetrics(BaseMiddleware):
+    """
+    Middleware уровня обновлений, которое считает обработанные обновления по типам, ошибки обработчиков и время
+    обработки последних `window` обновлений. Также считает запросы к базе данных через событие SQLAlchemy.
+    Счётчики живут только в памяти процесса и обнуляются при перезапуске.
+    """
+
+    def __init__(self, window: int = 5000):
+        """
+        Инициализирует счётчики.
+
+        :param window: Количество последних обновлений, по которым считаются пропускная способность и перцентили.
+        :type window: int
+        """
+        self.started = time.time()
+        self.updates, self.failed = Counter(), Counter()
+        self.latencies = deque(maxlen=window)
+        self.queries = 0
+        self.profiling = False
+
+    async def __call__(self, handler: Callable[[Update, dict[str, Any]], Awaitable[Any]], event: Update,
+                       data: dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.failed[event.event_type] += 1
+            raise
+        finally:
+            self.updates[event.event_type] += 1
+            self.latencies.append((time.time(), time.monotonic() - started))
+
+    def query(self, *_):
+        """Учитывает выполненный запрос к базе данных. Подписан на событие `after_cursor_execute`."""
+        self.queries += 1
+
+    def percentile(self, q: float) -> float:
+        """
+        Вычисляет перцентиль времени обработки последних обновлений.
+
+        :param q: Доля от 0 до 1, например 0.95.
+        :type q: float
+
+        :return: Время обработки в миллисекундах или 0, если обновлений ещё не было.
+        :rtype: float
+        """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(elapsed for _, elapsed in self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+    def throughput(self, period: float = 60) -> float:
+        """
+        Вычисляет количество обработанных обновлений в секунду за последние `period` секунд.
+
+        :param period: Длина периода в секундах.
+        :type period: float
+
+        :return: Обновлений в секунду.
+        :rtype: float
+        """
+        since = time.time() - period
+        return sum(1 for finished, _ in self.latencies if finished >= since) / period
+
+    async def profile(self, seconds: float, limit: int = 30) -> str:
+        """
+        Снимает профиль CPU потока цикла событий в течение `seconds` секунд, не останавливая работу бота.
+        Процессы-воркеры рассылки уведомлений в профиль не попадают.
+
+        :param seconds: Длительность профилирования в секундах.
+        :type seconds: float
+        :param limit: Количество функций в сводке.
+        :type limit: int
+
+        :return: Сводка `pstats`, отсортированная по суммарному времени.
+        :rtype: str
+
+        :raises RuntimeError: Если профиль уже снимается.
+        """
+        if self.profiling:
+            raise RuntimeError('profile is already running')
+        self.profiling, profiler = True, cProfile.Profile()
+        try:
+            profiler.enable()
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+            self.profiling = False
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return summary.getvalue()
+
+
+def ratio(part: int, total: int) -> str:
+    """
+    Форматирует долю для отчёта.
+
+    :param part: Часть.
+    :type part: int
+    :param total: Целое.
+    :type total: int
+
+    :return: Доля в процентах или прочерк, если целое равно нулю.
+    :rtype: str
+    """
+    return f'{part / total:.0%}' if total else '—'
+
+
+def collect_stats() -> dict[str, Any]:
+    """
+    Собирает текущие показатели бота для команды /stats.
+
+    :return: Словарь значений для шаблона `entities.STATS`.
+    :rtype: dict[str, Any]
+    """
+    uptime = time.time() - metrics.started
+    lookups = weather_cache.hits + weather_cache.misses
+    renders = edits.sent + edits.skipped
+    providers = '\n'.join(f'• {breaker.name}: {breaker.calls} вызовов, ошибок {ratio(breaker.errors, breaker.calls)}, '
+                          f'отклонено {breaker.rejected}, цепь {breaker.state}'
+                          for breaker in (owm, yandex, timezonedb))
+    stats = {
+        'uptime': f'{uptime // 3600:.0f} ч {uptime % 3600 // 60:.0f} мин',
+        'updates': sum(metrics.updates.values()),
+        'types': ', '.join(f'{kind} {count}' for kind, count in metrics.updates.most_common()) or '—',
+        'rate': metrics.throughput(),
+        'errors': ratio(sum(metrics.failed.values()), sum(metrics.updates.values())),
+        'p50': metrics.percentile(0.5),
+        'p95': metrics.percentile(0.95),
+        'queries': metrics.queries,
+        'providers': providers,
+        'cache': ratio(weather_cache.hits, lookups),
+        'lookups': lookups,
+        'edits': ratio(edits.skipped, renders),
+        'dropped': latest_wins.dropped,
+        'queue': pools.queued['jobs'] + pools.queued['broadcast'],
+        'sending': pools.active['jobs'] + pools.active['broadcast'],
+        'shed': sum(pools.shed.values()),
+        'lag': notifier.lag,
+        'duration': notifier.duration,
+    }
+    stats |= {f'fsm_{key}': value for key, value in storage.stats().items()}
+    return stats | {f'outbox_{key}': value for key, value in outbox.counts.items()}
+
+
+metrics = UpdateMetrics()
+event.listen(db.engine, 'after_cursor_execute', metrics.query)
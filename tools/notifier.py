@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from loader import db
+from tools.snapshot import UsersSnapshot, schedule
+from tools.workers import dispatch_notifies
+
+
+class NotifyScheduler:
+    """
+    Планировщик уведомлений по кольцу минутных слотов снимка пользователей. Вместо ежеминутного запуска он спит до
+    ближайшей минуты, на которую действительно есть получатели, срабатывает ровно на её границе и пересчитывает
+    расписание, как только уведомления добавляются или удаляются.
+    """
+
+    def __init__(self, snapshot: UsersSnapshot, callback: Callable[[int], Awaitable]):
+        """
+        Инициализирует планировщик.
+
+        :param snapshot: Колоночный снимок пользователей с кольцом минутных слотов.
+        :type snapshot: UsersSnapshot
+        :param callback: Корутина рассылки, принимающая минуту суток по UTC.
+        :type callback: Callable[[int], Awaitable]
+        """
+        self.snapshot, self.callback = snapshot, callback
+        self.wakeup, self.tasks, self.fired = asyncio.Event(), set(), None
+        self.lag = self.duration = 0.0
+
+    def reschedule(self, *_):
+        """Будит планировщик, чтобы он пересчитал ближайшую минуту с получателями. Подписан на изменения в базе."""
+        self.wakeup.set()
+
+    def start(self):
+        """Запускает планировщик в фоне текущего цикла событий."""
+        self._spawn(self.run())
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            now = int(time.time() // 60)
+            start = now + 1 if self.fired is None else max(self.fired + 1, now)
+            if (offset := self.snapshot.next_due(start % 1440)) is None:
+                await self.wakeup.wait()
+                continue
+            target = start + offset
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), max(target * 60 - time.time(), 0))
+                continue
+            except asyncio.TimeoutError:
+                pass
+            self.fired, self.lag = target, time.time() - target * 60
+            self._spawn(self.fire(target % 1440))
+
+    async def fire(self, minute: int):
+        started = time.monotonic()
+        try:
+            await self.callback(minute)
+        except Exception:
+            logging.exception('Рассылка уведомлений за минуту %s завершилась ошибкой', minute)
+        self.duration = time.monotonic() - started
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+notifier = NotifyScheduler(schedule, dispatch_notifies)
+db.subscribe(notifier.reschedule)
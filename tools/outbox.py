@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+
+from aiogram.exceptions import TelegramAPIError
+
+from loader import bot, db, settings
+from tenants import tenant
+from tools.bot import notify_board
+from tools.broadcast import deliver
+from tools.priority import pools
+
+
+class Outbox:
+    """
+    Доставщики уведомлений из персистентной очереди исходящих (таблица `outbox`). Сформированные уведомления минуты
+    записываются в очередь одной транзакцией, а несколько доставщиков независимо забирают их пачками через
+    `FOR UPDATE SKIP LOCKED` и отправляют с общим лимитом частоты Telegram. Так скорость формирования не зависит от
+    скорости отправки, а уведомления, не отправленные из-за падения бота, доставляются после перезапуска по истечении
+    аренды, если ещё не устарели. Доставка «хотя бы один раз»: сообщение, отправленное прямо перед падением, может уйти
+    повторно. Сообщения с известным итогом хранятся `keep` секунд, после чего удаляются.
+    """
+
+    def __init__(self, workers: int, batch: int = 100, lease: float = 300, backoff: float = 60, attempts: int = 5,
+                 idle: float = 15, max_age: float = 60 * 60, keep: float = 7 * 24 * 60 * 60):
+        """
+        Инициализирует доставщиков без запуска.
+
+        :param workers: Количество доставщиков.
+        :type workers: int
+        :param batch: Размер пачки, которую доставщик забирает за раз.
+        :type batch: int
+        :param lease: Время аренды пачки в секундах, после которого неподтверждённые сообщения забираются снова.
+        :type lease: float
+        :param backoff: Пауза в секундах перед повторной отправкой после сетевой ошибки, растущая с каждой попыткой.
+        :type backoff: float
+        :param attempts: Количество попыток, после которого сообщение считается недоставленным.
+        :type attempts: int
+        :param idle: Интервал в секундах, с которым пустая очередь проверяется на повторы и сообщения других процессов.
+        :type idle: float
+        :param max_age: Возраст сообщения в секундах, после которого оно не отправляется, а помечается устаревшим.
+        :type max_age: float
+        :param keep: Время в секундах, которое хранятся сообщения с известным итогом доставки.
+        :type keep: float
+        """
+        self.workers, self.batch, self.lease = workers, batch, lease
+        self.backoff, self.attempts, self.idle = backoff, attempts, idle
+        self.max_age, self.keep, self.pruned = max_age, keep, 0.0
+        self.wakeup, self.tasks = asyncio.Event(), set()
+        self.counts = dict.fromkeys(('sent', 'blocked', 'failed', 'expired', 'retried'), 0)
+
+    def start(self):
+        """Запускает доставщиков в фоне текущего цикла событий."""
+        for _ in range(self.workers):
+            task = asyncio.create_task(self.run())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def put(self, messages: list[tuple[int, int, str]]) -> int:
+        """
+        Ставит сообщения в очередь исходящих и будит доставщиков.
+
+        :param messages: Список кортежей (ID бота-арендатора, Telegram ID получателя, текст сообщения).
+        :type messages: list[tuple[int, int, str]]
+
+        :return: Количество поставленных в очередь сообщений.
+        :rtype: int
+        """
+        if not messages:
+            return 0
+        count = await db.enqueue_outbox(messages)
+        self.wakeup.set()
+        return count
+
+    async def run(self):
+        board = notify_board()
+        while True:
+            self.wakeup.clear()
+            try:
+                claimed = await db.claim_outbox(self.batch, self.lease)
+            except Exception:
+                logging.exception('Не удалось забрать сообщения из очереди исходящих')
+                claimed = []
+            if not claimed:
+                await self.prune()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), self.idle)
+                continue
+            try:
+                await self.drain(claimed, board)
+            except Exception:
+                logging.exception('Не удалось отправить пачку из очереди исходящих')
+
+    async def prune(self):
+        """Не чаще раза в час удаляет из очереди исходящих сообщения с известным итогом старше `keep` секунд."""
+        if time.time() - self.pruned < 60 * 60:
+            return
+        self.pruned = time.time()
+        try:
+            logging.info('Из очереди исходящих удалено %s старых сообщений',
+                         await db.prune_outbox(self.pruned - self.keep))
+        except Exception:
+            logging.exception('Не удалось очистить очередь исходящих')
+
+    async def drain(self, claimed: list[tuple[int, int, int, str, int, float]], board):
+        """
+        Отправляет забранную пачку от имени ботов-арендаторов сообщений и записывает итоги: доставленные,
+        заблокировавшие бота и отклонённые Telegram сообщения закрываются, а при сетевых ошибках сообщение
+        возвращается в очередь с паузой. Сообщения старше `max_age` не отправляются.
+
+        :param claimed: Строки очереди (id, tenant, tg_id, text, attempts, created_at).
+        :type claimed: list[tuple[int, int, int, str, int, float]]
+        :param board: Inline-клавиатура уведомления.
+        """
+        results = {'sent': [], 'blocked': [], 'failed': [], 'expired': []}
+        retries = {}
+        for id_, tenant_id, tg_id, text, attempts, created_at in claimed:
+            if time.time() - created_at > self.max_age:
+                results['expired'].append(id_)
+                continue
+            if tenant_id not in bot.bots:
+                logging.warning('Уведомление %s пропущено: бот-арендатор %s больше не настроен', id_, tenant_id)
+                results['failed'].append(id_)
+                continue
+            tenant.set(tenant_id)
+            try:
+                async with pools.slot('jobs'):
+                    results[await deliver(tg_id, text, board)].append(id_)
+            except TelegramAPIError as e:
+                if attempts + 1 >= self.attempts:
+                    logging.warning('Уведомление для %s не доставлено после %s попыток: %r', tg_id, attempts + 1, e)
+                    results['failed'].append(id_)
+                else:
+                    retries.setdefault(self.backoff * 2 ** attempts, []).append(id_)
+        for status, ids in results.items():
+            await db.finish_outbox(status, ids)
+            self.counts[status] += len(ids)
+        for delay, ids in retries.items():
+            await db.retry_outbox(ids, delay)
+            self.counts['retried'] += len(ids)
+
+
+outbox = Outbox(settings.outbox_workers)
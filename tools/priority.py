@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, Message
+
+from entities import BUSY
+from loader import settings
+
+# Класс задач: (приоритет — чем меньше, тем важнее; предел одновременных задач класса; сбрасывать ли при переполнении)
+POOLS = {
+    'callbacks': (0, 32, True),
+    'messages': (1, 32, True),
+    'jobs': (2, 16, False),
+    'broadcast': (3, 10, False),
+}
+
+
+class OverloadedError(RuntimeError):
+    """Очередь класса задач переполнена, и задача сброшена без выполнения."""
+
+
+class PriorityPools:
+    """
+    Общий для всего цикла событий пул слотов выполнения с ограничением конкурентности по классам задач и строгим
+    приоритетом: освободившийся слот отдаётся ожидающей задаче самого важного класса, которая может его занять.
+    Интерактивные классы при переполнении очереди сбрасывают новые задачи через `OverloadedError`, а фоновые
+    (уведомления, рассылки) только ждут, поэтому волна уведомлений не увеличивает задержку ответа пользователям.
+    """
+
+    def __init__(self, limit: int, depth: int, pools: dict[str, tuple[int, int, bool]] = None):
+        """
+        Инициализирует пул.
+
+        :param limit: Общий предел одновременно выполняемых задач.
+        :type limit: int
+        :param depth: Предел очереди ожидающих задач для сбрасываемых классов.
+        :type depth: int
+        :param pools: Классы задач в формате `POOLS`.
+        :type pools: dict[str, tuple[int, int, bool]]
+        """
+        self.limit, self.depth, self.pools = limit, depth, pools or POOLS
+        self.running, self.waiting = 0, []
+        self.active = dict.fromkeys(self.pools, 0)
+        self.queued = dict.fromkeys(self.pools, 0)
+        self.shed = dict.fromkeys(self.pools, 0)
+        self.counter = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, kind: str):
+        """
+        Занимает слот выполнения для задачи заданного класса на время блока `async with`.
+
+        :param kind: Класс задачи: ключ `POOLS`.
+        :type kind: str
+
+        :raises OverloadedError: Если класс сбрасываемый, а его очередь заполнена.
+        """
+        await self.acquire(kind)
+        try:
+            yield
+        finally:
+            self.release(kind)
+
+    async def acquire(self, kind: str):
+        """
+        Дожидается слота выполнения для задачи заданного класса.
+
+        :param kind: Класс задачи: ключ `POOLS`.
+        :type kind: str
+
+        :raises OverloadedError: Если класс сбрасываемый, а его очередь заполнена.
+        """
+        priority, _, sheddable = self.pools[kind]
+        if self._fits(kind):
+            return self._take(kind)
+        if sheddable and self.queued[kind] >= self.depth:
+            self.shed[kind] += 1
+            raise OverloadedError(kind)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.counter), kind, future))
+        self.queued[kind] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(kind)
+            else:
+                self.waiting.remove(next(entry for entry in self.waiting if entry[3] is future))
+                heapq.heapify(self.waiting)
+                self.queued[kind] -= 1
+            raise
+
+    def release(self, kind: str):
+        """
+        Освобождает слот выполнения и передаёт его ожидающим задачам в порядке приоритета.
+
+        :param kind: Класс задачи: ключ `POOLS`.
+        :type kind: str
+        """
+        self.running -= 1
+        self.active[kind] -= 1
+        skipped = []
+        while self.waiting and self.running < self.limit:
+            entry = heapq.heappop(self.waiting)
+            if not self._fits(entry[2]):
+                skipped.append(entry)
+                continue
+            self.queued[entry[2]] -= 1
+            self._take(entry[2])
+            entry[3].set_result(None)
+        for entry in skipped:
+            heapq.heappush(self.waiting, entry)
+
+    def _fits(self, kind: str) -> bool:
+        return self.running < self.limit and self.active[kind] < self.pools[kind][1]
+
+    def _take(self, kind: str):
+        self.running += 1
+        self.active[kind] += 1
+
+
+class LoadShedMiddleware(BaseMiddleware):
+    """
+    Middleware, выполняющее обработку каждого обновления в слоте `PriorityPools` своего класса. Если очередь класса
+    переполнена, обновление сбрасывается: на callback-запрос сразу отвечается уведомлением о перегрузке, на сообщение —
+    коротким ответом.
+    """
+
+    def __init__(self, pools: PriorityPools, kind: str):
+        """
+        Инициализирует middleware.
+
+        :param pools: Пул слотов выполнения.
+        :type pools: PriorityPools
+        :param kind: Класс задач обновлений этого типа: ключ `POOLS`.
+        :type kind: str
+        """
+        self.pools, self.kind = pools, kind
+
+    async def __call__(self, handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+                       event: CallbackQuery | Message, data: dict[str, Any]) -> Any:
+        try:
+            await self.pools.acquire(self.kind)
+        except OverloadedError:
+            logging.warning('Перегрузка: обновление класса %s сброшено', self.kind)
+            with suppress(TelegramAPIError):
+                await event.answer(BUSY)
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            self.pools.release(self.kind)
+
+
+pools = PriorityPools(settings.pool_limit, settings.pool_queue)
@@ -0,0 +1,118 @@
+import sys
+from array import array
+
+from loader import db
+from tenants import tenant
+from tools.converters import geo_to_cell
+
+MSK_OFFSET = 3 * 60
+
+
+class UsersSnapshot:
+    """
+    Компактный колоночный (struct-of-arrays) снимок пользователей для планировщика уведомлений.
+    Каждая строка — одно уведомление одного пользователя; колонки хранятся в плотных массивах `array`, а не в
+    ORM-объектах, и обновляются точечно при записи в базу данных через `Database.subscribe`. Кольцо `wheel` хранит
+    для каждой минуты суток по UTC множество номеров строк, уведомления которых приходятся на эту минуту, так что
+    планировщик `tools.notifier` получает строки минуты без просмотра всего снимка.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self.tg_id, self.lon, self.lat = array('q'), array('d'), array('d')
+        self.minute, self.tz_shift, self.cell = array('H'), array('b'), array('q')
+        self.city, self.tenant = [], array('q')
+        self.rows = {}
+        self.wheel = [set() for _ in range(1440)]
+
+    def __len__(self) -> int:
+        return len(self.tg_id)
+
+    def load(self):
+        """Полностью перестраивает снимок по данным из базы данных."""
+
+        self._reset()
+        for row in db.schedule_rows():
+            self._append(*row)
+
+    def refresh(self, tg_id: int):
+        """
+        Перечитывает из базы данных строки одного пользователя текущего арендатора, заменяя его строки в снимке.
+        Передаётся в `Database.subscribe` как слушатель изменений.
+
+        :param tg_id: Telegram ID изменённого пользователя.
+        :type tg_id: int
+        """
+
+        for i in sorted(self.rows.pop((tenant.get(), tg_id), []), reverse=True):
+            self._remove(i)
+        for row in db.schedule_rows(tg_id):
+            self._append(*row)
+
+    def due(self, minute: int) -> list[tuple]:
+        """
+        Возвращает строки, уведомления которых приходятся на заданную минуту суток по UTC.
+
+        :param minute: Минута суток по UTC (0–1439).
+        :type minute: int
+
+        :return: Список кортежей (tg_id, lon, lat, tz_shift, cell, city, tenant).
+        :rtype: list[tuple]
+        """
+
+        return [(self.tg_id[i], self.lon[i], self.lat[i], self.tz_shift[i], self.cell[i], self.city[i], self.tenant[i])
+                for i in sorted(self.wheel[minute])]
+
+    def next_due(self, minute: int) -> int | None:
+        """
+        Ищет по кольцу из 1440 минутных слотов ближайшую минуту, на которую есть хотя бы одно уведомление, с учётом
+        перехода через полночь.
+
+        :param minute: Минута суток по UTC, с которой начинается поиск (включительно).
+        :type minute: int
+
+        :return: Количество минут от `minute` до ближайшей минуты с уведомлениями или None, если уведомлений нет.
+        :rtype: Union[int, None]
+        """
+
+        for offset in range(1440):
+            if self.wheel[(minute + offset) % 1440]:
+                return offset
+
+    def _append(self, tg_id: int, geo: list[float], notify_time: list, tz_shift: int | None, city: str | None,
+                tenant_id: int):
+        if not geo or tz_shift is None:
+            return
+        for nt in notify_time or []:
+            self.rows.setdefault((tenant_id, tg_id), []).append(i := len(self.tg_id))
+            self.tg_id.append(tg_id)
+            self.lon.append(geo[0])
+            self.lat.append(geo[1])
+            self.minute.append(minute := (nt.hour * 60 + nt.minute - MSK_OFFSET) % 1440)
+            self.wheel[minute].add(i)
+            self.tz_shift.append(tz_shift)
+            self.cell.append(geo_to_cell(geo))
+            self.city.append(sys.intern(city or ''))
+            self.tenant.append(tenant_id)
+
+    def _remove(self, i: int):
+        self.wheel[self.minute[i]].discard(i)
+        last = len(self.tg_id) - 1
+        if i != last:
+            moved = self.tenant[last], self.tg_id[last]
+            self.wheel[self.minute[last]].discard(last)
+            self.wheel[self.minute[last]].add(i)
+            for column in self._columns():
+                column[i] = column[last]
+            self.rows[moved][self.rows[moved].index(last)] = i
+        for column in self._columns():
+            column.pop()
+
+    def _columns(self) -> tuple:
+        return self.tg_id, self.lon, self.lat, self.minute, self.tz_shift, self.cell, self.city, self.tenant
+
+
+schedule = UsersSnapshot()
+db.subscribe(schedule.refresh)
@@ -0,0 +1,74 @@
+from datetime import date, datetime, time, timedelta
+from math import acos, asin, cos, degrees, radians, sin
+
+MSK_OFFSET = 3
+UNIX_EPOCH_JD, J2000 = 2440587.5, 2451545.0
+
+
+def sun_times(geos: list[list[float]], utc_offsets: list[float], days: list[date]) -> list[tuple[time, time]]:
+    """
+    Пакетно вычисляет время восхода и заката Солнца по уравнению восхода (алгоритм NOAA) для множества
+    местоположений сразу, без обращения к сети. Точность — около минуты.
+
+    :param geos: Список координат (долгота, широта) местоположений.
+    :type geos: list[list[float]]
+    :param utc_offsets: Смещения местного времени относительно UTC в часах для каждого местоположения.
+    :type utc_offsets: list[float]
+    :param days: Местные даты, для которых нужно вычислить восход и закат.
+    :type days: list[datetime.date]
+
+    :return: Список кортежей из местного времени восхода и заката. Во время полярного дня или ночи вместо времени
+             возвращается None.
+    :rtype: list[tuple[datetime.time, datetime.time]]
+    """
+
+    result = []
+    for (lon, lat), offset, day in zip(geos, utc_offsets, days):
+        j_star = day.toordinal() + 1721425 - J2000 + 0.0008 - lon / 360
+        m = radians((357.5291 + 0.98560028 * j_star) % 360)
+        c = 1.9148 * sin(m) + 0.02 * sin(2 * m) + 0.0003 * sin(3 * m)
+        ecliptic = radians((degrees(m) + c + 180 + 102.9372) % 360)
+        transit = J2000 + j_star + 0.0053 * sin(m) - 0.0069 * sin(2 * ecliptic)
+        declination = asin(sin(ecliptic) * sin(radians(23.4397)))
+        cos_hour = ((sin(radians(-0.833)) - sin(radians(lat)) * sin(declination))
+                    / (cos(radians(lat)) * cos(declination)))
+        if not -1 <= cos_hour <= 1:
+            result.append((None, None))
+            continue
+        hour_angle = degrees(acos(cos_hour)) / 360
+        result.append(tuple(
+            (datetime(1970, 1, 1) + timedelta(days=jd - UNIX_EPOCH_JD, hours=offset)).time().replace(microsecond=0)
+            for jd in (transit - hour_angle, transit + hour_angle)
+        ))
+    return result
+
+
+def local_now(tz_shift: int) -> datetime:
+    """
+    Возвращает текущее местное время пользователя.
+
+    :param tz_shift: Сдвиг часового пояса пользователя относительно московского времени в часах.
+    :type tz_shift: int
+
+    :return: Текущее местное время.
+    :rtype: datetime
+    """
+
+    return datetime.utcnow() + timedelta(hours=tz_shift + MSK_OFFSET)
+
+
+def sun_status(geo: list[float], tz_shift: int) -> dict:
+    """
+    Вычисляет время восхода и заката Солнца на сегодня в часовом поясе пользователя.
+
+    :param geo: Список из двух чисел с плавающей точкой, представляющих долготу и широту местоположения.
+    :type geo: list[float]
+    :param tz_shift: Сдвиг часового пояса пользователя относительно московского времени в часах.
+    :type tz_shift: int
+
+    :return: Словарь с ключами 'sunrise' и 'sunset'.
+    :rtype: dict
+    """
+
+    (sunrise, sunset), = sun_times([geo], [tz_shift + MSK_OFFSET], [local_now(tz_shift).date()])
+    return {'sunrise': sunrise, 'sunset': sunset}
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+TELEGRAM_RATE = 25
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты по алгоритму «ведра с токенами»: пропускает не больше `rate` событий в секунду,
+    допуская всплески до `burst` событий подряд.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Инициализирует ограничитель частоты.
+
+        :param rate: Допустимое количество событий в секунду.
+        :type rate: float
+        :param burst: Максимальное количество событий, которое можно пропустить подряд без ожидания.
+        :type burst: int
+        """
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = float(burst), time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Дожидается, пока частота событий позволит пропустить ещё одно."""
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from loader import db, ephemeral, settings
+from tools.bot import fetch_notify_weather, render_notifies
+from tools.outbox import outbox
+from tools.snapshot import schedule
+
+
+def detach():
+    """
+    Инициализатор процесса пула: отвязывает процесс от унаследованных через fork соединений с базой данных, чтобы
+    он не закрыл и не использовал сокеты основного процесса. Пул SQLAlchemy заменяется новым без закрытия
+    соединений, а соединение SQLite эфемерных состояний забывается.
+    """
+    db.engine.dispose(close=False)
+    ephemeral.connection = None
+
+
+class ShardPool:
+    """
+    Пул процессов для формирования уведомлений большой минуты. Получатели шардируются по хэшу Telegram ID, тексты
+    каждого шарда формируются в отдельном процессе, а координатор в основном процессе собирает их и ставит в очередь
+    исходящих.
+    """
+
+    def __init__(self, workers: int):
+        """
+        Инициализирует пул. Процессы создаются через fork при первой рассылке и наследуют загруженные модули,
+        в том числе словари pymorphy2, но не соединения с базой данных: их отвязывает `detach`.
+
+        :param workers: Количество процессов.
+        :type workers: int
+        """
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers, multiprocessing.get_context('fork'), initializer=detach)
+
+    async def run(self, due: list[tuple], weathers: dict[tuple, dict]) -> list[tuple[int, int, str]]:
+        """
+        Раздаёт получателей по шардам и дожидается текстов их уведомлений.
+
+        :param due: Строки снимка получателей (tg_id, lon, lat, tz_shift, cell, city, tenant).
+        :type due: list[tuple]
+        :param weathers: Погода для групп получателей.
+        :type weathers: dict[tuple, dict]
+
+        :return: Список кортежей (ID бота-арендатора, Telegram ID получателя, текст уведомления) всех шардов.
+        :rtype: list[tuple[int, int, str]]
+        """
+        shards = [[] for _ in range(self.workers)]
+        for row in due:
+            if (row[4], row[5], row[3]) in weathers:
+                shards[hash(row[0]) % self.workers].append(row)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, render_notifies, shard,
+                                 {(cell, city, tz_shift): weathers[(cell, city, tz_shift)]
+                                  for _, _, _, tz_shift, cell, city, _ in shard})
+            for shard in shards if shard
+        ))
+        return [message for messages in results for message in messages]
+
+
+pool = ShardPool(settings.notify_workers) if settings.notify_workers > 1 else None
+
+
+async def dispatch_notifies(minute: int):
+    """
+    Координатор уведомлений за минуту: формирует тексты уведомлений и одной транзакцией ставит их в персистентную
+    очередь исходящих `tools.outbox`, откуда их отправляют доставщики. Небольшие минуты формируются в основном
+    процессе, а минуты с числом получателей от `NOTIFY_SHARD_THRESHOLD` раздаются пулу процессов.
+
+    :param minute: Минута суток по UTC.
+    :type minute: int
+    """
+    due = schedule.due(minute)
+    weathers = await fetch_notify_weather(due)
+    if pool is None or len(due) < settings.notify_shard_threshold:
+        messages = render_notifies(due, weathers)
+    else:
+        messages = await pool.run(due, weathers)
+    logging.info('Уведомления за минуту %s поставлены в очередь: %s из %s получателей',
+                 minute, await outbox.put(messages), len(due))